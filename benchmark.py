@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""Benchmarks of Graph and every task on seeded synthetic graphs.
+
+Prints a table and writes results as JSON, a previous JSON file can be
+given to compare against:
+
+    ./benchmark.py --scale 2 --output bench.json
+    ./benchmark.py --compare bench.json --only task7 task9
+"""
+
+import argparse
+from functools import partial
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from binary_graph import open_binary, save_binary
+from graph import Graph, GraphException
+import graph_generators as gen
+from graph_tasks import (task1, task2, task3, task4, task5, task6,
+                         task7, task8, task9)
+
+
+def cases(scale, seed):
+    """(name, make graph, run on graph) for every benchmark"""
+    def size(n):
+        return max(2, int(n * scale))
+
+    n = size(2000)
+    sparse = partial(gen.erdos_renyi, n, 5 * n, seed=seed)
+    sparse_undirected = partial(gen.erdos_renyi, n, 5 * n, directed=False,
+                                seed=seed)
+    side = max(2, int(40 * scale ** 0.5))
+    lattice = partial(gen.grid, side, side, seed=seed)
+    hubs = partial(gen.scale_free, n, 3, seed=seed)
+    tree = partial(gen.random_tree, size(20000), seed=seed)
+    forest = partial(gen.random_forest, size(20000), 10, seed=seed)
+    negative = partial(gen.negative_cycle, n, 5 * n, seed=seed)
+    small = size(120)  # for cubic algorithms
+    dense = partial(gen.erdos_renyi, small, 10 * small, seed=seed)
+
+    return [
+        ("task1/erdos_renyi", sparse, lambda gr: task1(gr, "0")),
+        ("task2/erdos_renyi", sparse_undirected, lambda gr: task2(gr, "0")),
+        ("task2/scale_free", hubs, lambda gr: task2(gr, "0")),
+        ("task3/erdos_renyi", sparse, task3),
+        ("task4/tree", tree, task4),
+        ("task4/forest", forest, task4),
+        ("task5/erdos_renyi", sparse, lambda gr: task5(gr, "0", "1")),
+        ("task5/grid", lattice, lambda gr: task5(gr, "0", "1")),
+        ("task6/prim/grid", lattice, task6),
+        ("task6/kruskal/grid", lattice,
+         lambda gr: task6(gr, engine="kruskal")),
+        ("task6/prim/scale_free", hubs, task6),
+        ("task7/erdos_renyi", sparse, lambda gr: task7(gr, "0")),
+        ("task7/grid", lattice, lambda gr: task7(gr, "0")),
+        ("task8/erdos_renyi", sparse, lambda gr: task8(gr, "0", "1", 5)),
+        ("task8/negative_cycle", negative,
+         lambda gr: task8(gr, "0", "1", 5)),
+        ("task9/floyd", dense, task9),
+        ("task9/johnson", dense,
+         lambda gr: task9(gr, engine="johnson", workers=1)),
+        ("load/erdos_renyi", sparse, _load),
+        ("save/erdos_renyi", sparse, _save),
+        ("load_binary/erdos_renyi", sparse, _load_binary),
+        ("save_binary/erdos_renyi", sparse, _save_binary),
+    ]
+
+
+def _scratch(name):
+    return os.path.join(tempfile.gettempdir(),
+                        f"graph-benchmark-{os.getpid()}-{name}")
+
+
+def _load(gr):
+    return Graph(_scratch("load.txt"))
+
+
+def _save(gr):
+    gr.save(_scratch("save.txt"))
+
+
+def _load_binary(gr):
+    fr = open_binary(_scratch("load.bin"))
+    fr.get_adjacent("0")  # touch it, opening alone reads nothing
+    return fr
+
+
+def _save_binary(gr):
+    save_binary(gr, _scratch("save.bin"))
+
+
+# files a case reads, written before it is timed
+FIXTURES = {
+    _load: lambda gr: gr.save(_scratch("load.txt")),
+    _load_binary: lambda gr: save_binary(gr, _scratch("load.bin")),
+}
+
+
+def measure(run, gr, repeat):
+    """best time of repeated runs and peak memory of one more run"""
+    best = None
+    error = None
+    for _ in range(repeat):
+        # a fresh copy (cheap, copy-on-write) doesn't keep indexes built
+        # by the previous run, so every run starts cold
+        copy = Graph(gr)
+        start = time.perf_counter()
+        try:
+            run(copy)
+        except GraphException as e:  # some cases are expected to fail
+            error = str(e)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+
+    # tracing slows everything down, so it isn't part of timing
+    copy = Graph(gr)
+    tracemalloc.start()
+    try:
+        run(copy)
+    except GraphException:
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, error
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiply graph sizes (default 1)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="timed runs per case, best one counts")
+    parser.add_argument("--only", nargs="+", metavar="PREFIX",
+                        help="run cases whose name starts with a prefix")
+    parser.add_argument("--output", help="write results as JSON here")
+    parser.add_argument("--compare", metavar="JSON",
+                        help="show time ratios against a previous run")
+    args = parser.parse_args(argv)
+
+    before = {}
+    if args.compare:
+        with open(args.compare) as f:
+            before = {r["name"]: r for r in json.load(f)["results"]}
+
+    graphs = {}  # generators are shared by cases, build once
+    results = []
+    try:
+        for name, make, run in cases(args.scale, args.seed):
+            if args.only and not name.startswith(tuple(args.only)):
+                continue
+            if make not in graphs:
+                graphs[make] = make()
+            gr = graphs[make]
+            if run in FIXTURES:
+                FIXTURES[run](gr)
+            seconds, peak, error = measure(run, gr, args.repeat)
+            res = {"name": name,
+                   "vertices": len(gr.get_vertices()),
+                   "edges": sum(len(gr.get_adjacent(v))
+                                for v in gr.get_vertices()),
+                   "seconds": seconds,
+                   "peak_bytes": peak,
+                   "error": error}
+            results.append(res)
+
+            line = f"{name:28} {seconds * 1000:10.1f} ms " \
+                f"{peak / 2 ** 20:9.1f} MiB"
+            if name in before:
+                ratio = seconds / max(before[name]["seconds"], 1e-9)
+                line += f"  x{ratio:.2f}"
+            if error is not None:
+                line += f"  ({error})"
+            print(line)
+    finally:
+        for suffix in ("load.txt", "save.txt", "load.bin", "save.bin"):
+            if os.path.exists(_scratch(suffix)):
+                os.remove(_scratch(suffix))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"python": sys.version,
+                       "platform": platform.platform(),
+                       "scale": args.scale,
+                       "seed": args.seed,
+                       "repeat": args.repeat,
+                       "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
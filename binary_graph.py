@@ -0,0 +1,161 @@
+from array import array
+from collections.abc import Sequence
+import mmap
+import struct
+
+from graph import Graph, FrozenGraph, GraphException
+
+# File layout, all numbers in native byte order (checked via ENDIAN_MARK):
+#   header: magic, endian mark, version, flags, weight type code,
+#           vertex count, CSR entry count
+#   table of (position, size) for every section
+#   sections, each aligned to 8 bytes:
+#     name_offsets  int64[n + 1]  bounds of UTF-8 names in name_blob
+#     name_blob     bytes         vertex names sorted, id = position
+#     offsets       int64[n + 1]  CSR row bounds
+#     targets       int64[m]      CSR targets
+#     weights       int64/double[m] (empty if not weighted)
+#     incdegs       int64[n]      incoming degrees
+MAGIC = b"GRAPHBIN"
+ENDIAN_MARK = 0x01020304
+VERSION = 1
+SECTIONS = ("name_offsets", "name_blob", "offsets",
+            "targets", "weights", "incdegs")
+HEADER = struct.Struct("=8sIIIIQQ")  # native order, standard sizes
+TABLE = struct.Struct("=" + "QQ" * len(SECTIONS))
+
+FLAG_DIRECTED = 1
+FLAG_WEIGHTED = 2
+WEIGHT_CODES = {None: 0, int: ord("q"), float: ord("d")}
+
+
+class _NameTable(Sequence):
+    """vertex names read lazily from a sorted, memory-mapped table"""
+
+    def __init__(self, bounds, blob):
+        self.__bounds = bounds
+        self.__blob = blob
+
+    def __len__(self):
+        return len(self.__bounds) - 1
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.__raw(i).decode()
+
+    def __raw(self, i):
+        return bytes(self.__blob[self.__bounds[i]:self.__bounds[i + 1]])
+
+    def get(self, name, default=None):
+        """id of name by binary search, no dict is built"""
+        if not isinstance(name, str):
+            return default
+        key = name.encode()
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.__raw(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self) and self.__raw(lo) == key:
+            return lo
+        return default
+
+
+def save_binary(gr, path):
+    """write graph (or frozen graph) to the binary format"""
+    if gr.is_weighted() and gr.get_weight_type() not in WEIGHT_CODES:
+        raise GraphException("Binary format keeps only int "
+                             "or float weights!")
+    # sorted names make lookups possible without building a dict;
+    # str order matches the order of their UTF-8 bytes
+    fr = FrozenGraph(gr, sort=True)
+    weights = fr.weights()
+    if gr.is_weighted() and not isinstance(weights, memoryview):
+        raise GraphException("Binary format keeps only int "
+                             "or float weights!")
+
+    names = [v.encode() for v in fr.names()]
+    name_offsets = array("q", [0])
+    for name in names:
+        name_offsets.append(name_offsets[-1] + len(name))
+    sections = (name_offsets, b"".join(names), fr.offsets(),
+                fr.targets(), weights if weights is not None else b"",
+                fr.incdegs())
+
+    flags = (FLAG_DIRECTED if gr.is_directed() else 0) | \
+        (FLAG_WEIGHTED if gr.is_weighted() else 0)
+    pos = HEADER.size + TABLE.size
+    table = []
+    for data in sections:
+        pos += -pos % 8
+        size = memoryview(data).nbytes
+        table.extend((pos, size))
+        pos += size
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, ENDIAN_MARK, VERSION, flags,
+                            WEIGHT_CODES[fr.get_weight_type()],
+                            fr.vertex_count(), fr.edge_count()))
+        f.write(TABLE.pack(*table))
+        for data, pos in zip(sections, table[::2]):
+            f.write(bytes(pos - f.tell()))
+            f.write(memoryview(data).cast("B"))
+
+
+def open_binary(path):
+    """memory-map a binary graph file as a FrozenGraph
+
+    Nothing is parsed up front: arrays are views into the mapping and
+    vertex names are looked up by binary search, so opening costs the
+    same for any file size.
+    """
+    with open(path, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            raise GraphException("Not a binary graph file!")
+    buf = memoryview(mm)
+    if len(buf) < HEADER.size + TABLE.size:
+        raise GraphException("Not a binary graph file!")
+    magic, mark, version, flags, wcode, n, m = \
+        HEADER.unpack_from(buf)
+    if magic != MAGIC:
+        raise GraphException("Not a binary graph file!")
+    if mark != ENDIAN_MARK:
+        raise GraphException("Binary graph was written on a machine "
+                             "with different byte order!")
+    if version != VERSION:
+        raise GraphException("Unsupported binary graph "
+                             f"version {version}!")
+    table = TABLE.unpack_from(buf, HEADER.size)
+    sections = list(zip(table[::2], table[1::2]))  # (position, size)
+    if any(pos + size > len(buf) for pos, size in sections):
+        raise GraphException("Binary graph file is truncated!")
+
+    weight_types = {code: t for t, code in WEIGHT_CODES.items()}
+    formats = {"name_offsets": "q", "name_blob": "B", "offsets": "q",
+               "targets": "q", "weights": chr(wcode) if wcode else "B",
+               "incdegs": "q"}
+    views = {}
+    for name, (pos, size) in zip(SECTIONS, sections):
+        views[name] = buf[pos:pos + size].cast(formats[name])
+
+    names = _NameTable(views["name_offsets"], views["name_blob"])
+    attributes = ("" if flags & FLAG_DIRECTED else "not_") + "directed", \
+        ("" if flags & FLAG_WEIGHTED else "not_") + "weighted"
+    weights = views["weights"] if flags & FLAG_WEIGHTED else None
+    return FrozenGraph.from_arrays(attributes, names, names,
+                                   views["offsets"], views["targets"],
+                                   weights, weight_types[wcode],
+                                   views["incdegs"])
+
+
+def text_to_binary(src, dst, *, weight_type=None):
+    save_binary(Graph(src, weight_type=weight_type), dst)
+
+
+def binary_to_text(src, dst):
+    open_binary(src).save(dst)
@@ -0,0 +1,71 @@
+from disjoint_set import DisjointSet
+from graph import GraphException, GraphIndex
+
+
+class ConnectivityIndex(GraphIndex):
+    """Connected components of a graph (weakly connected for directed
+    graphs, edge directions are ignored).
+
+    Built on a union-find: added vertices and edges are merged in as they
+    come, so insert-only workloads never rebuild. Removing an edge or a
+    vertex may split a component, which union-find can't undo; such a
+    change marks the index stale and the next query rebuilds it. An edge
+    removed while a reverse edge is kept doesn't split anything.
+    """
+
+    def __init__(self, gr):
+        self.__gr = gr
+        self.__sets = None
+        super().__init__(gr)
+
+    def __build(self):
+        gr = self.__gr
+        sets = DisjointSet(gr.get_vertices())
+        for v in gr.get_vertices():
+            for u in gr.get_adjacent(v):
+                sets.union(v, u)
+        self.__sets = sets
+
+    def _changed(self, event, *args):
+        sets = self.__sets
+        if sets is None:
+            return
+        if event == "add_vertex":
+            sets.add(args[0])
+        elif event == "add_edge":
+            sets.union(args[0], args[1])
+        elif event == "remove_edge":
+            if args[0] != args[1] and \
+                    not self.__gr.exists_edge(args[1], args[0]):
+                self.__sets = None
+        elif event == "remove_vertex":
+            self.__sets = None
+
+    def __find(self, v):
+        if self.__sets is None:
+            self.__build()
+        if v not in self.__sets:
+            raise GraphException("No such vertex!")
+        return self.__sets.find(v)
+
+    def component_of(self, v):
+        """representative vertex, the same for the whole component
+        (may change after the graph changes)"""
+        return self.__find(v)
+
+    def connected(self, u, v):
+        return self.__find(u) == self.__find(v)
+
+    def num_components(self):
+        if self.__sets is None:
+            self.__build()
+        return self.__sets.count()
+
+    def components(self):
+        """list of sets of vertices, one per component"""
+        if self.__sets is None:
+            self.__build()
+        comps = {}
+        for v in self.__gr.get_vertices():
+            comps.setdefault(self.__sets.find(v), set()).add(v)
+        return list(comps.values())
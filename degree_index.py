@@ -0,0 +1,81 @@
+import bisect
+import itertools
+
+from graph import GraphException, GraphIndex
+
+
+class DegreeIndex(GraphIndex):
+    """Vertices grouped by outgoing (or incoming) degree.
+
+    Keeps a bucket of vertices for every degree present plus the sorted
+    list of those degrees, so "degree greater than d" and "top k by
+    degree" cost O(log V + output). Follows changes of a Graph through
+    subscribe, every edge change moves its ends between neighbouring
+    buckets.
+    """
+
+    def __init__(self, gr, *, incoming=False):
+        self.__gr = gr
+        self.__incoming = incoming
+        degree = gr.get_incdeg if incoming else gr.get_outdeg
+        self.__degs = {v: degree(v) for v in gr.get_vertices()}
+        self.__buckets = {}  # degree -> set of vertices
+        for v, deg in self.__degs.items():
+            self.__buckets.setdefault(deg, set()).add(v)
+        self.__sorted = sorted(self.__buckets)  # degrees present
+        super().__init__(gr)
+
+    def __put(self, v, deg):
+        bucket = self.__buckets.get(deg)
+        if bucket is None:
+            bucket = self.__buckets[deg] = set()
+            bisect.insort(self.__sorted, deg)
+        bucket.add(v)
+        self.__degs[v] = deg
+
+    def __take(self, v):
+        deg = self.__degs.pop(v)
+        bucket = self.__buckets[deg]
+        bucket.discard(v)
+        if len(bucket) == 0:
+            del self.__buckets[deg]
+            del self.__sorted[bisect.bisect_left(self.__sorted, deg)]
+        return deg
+
+    def _changed(self, event, *args):
+        if event == "add_vertex":
+            self.__put(args[0], 0)
+        elif event == "remove_vertex":
+            self.__take(args[0])
+        else:
+            step = 1 if event == "add_edge" else -1
+            x, y = args[0], args[1]
+            ends = [y if self.__incoming else x]
+            if not self.__gr.is_directed() and x != y:
+                ends.append(x if self.__incoming else y)
+            for v in ends:
+                self.__put(v, self.__take(v) + step)
+
+    def degree(self, v):
+        if v not in self.__degs:
+            raise GraphException("No such vertex!")
+        return self.__degs[v]
+
+    def greater(self, d):
+        """set of vertices with degree larger than d"""
+        res = set()
+        for deg in self.__sorted[bisect.bisect_right(self.__sorted, d):]:
+            res |= self.__buckets[deg]
+        return res
+
+    def top(self, k):
+        """list of (vertex, degree) for k vertices of largest degree,
+        largest first (ties in no particular order)"""
+        res = []
+        for deg in reversed(self.__sorted):
+            if len(res) >= k:
+                break
+            bucket = self.__buckets[deg]
+            res.extend((v, deg) for v in
+                       itertools.islice(bucket, k - len(res)))
+        return res
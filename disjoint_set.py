@@ -0,0 +1,49 @@
+class DisjointSet():
+    """Union-find over hashable items with path halving and union by size"""
+
+    def __init__(self, items=()):
+        self.__parent = {}
+        self.__size = {}
+        self.__count = 0
+        for x in items:
+            self.add(x)
+
+    def __contains__(self, x):
+        return x in self.__parent
+
+    def __len__(self):
+        return len(self.__parent)
+
+    def add(self, x):
+        if x not in self.__parent:
+            self.__parent[x] = x
+            self.__size[x] = 1
+            self.__count += 1
+
+    def find(self, x):
+        parent = self.__parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, x, y):
+        """merge sets of x and y, False if they were already together"""
+        x = self.find(x)
+        y = self.find(y)
+        if x == y:
+            return False
+        if self.__size[x] < self.__size[y]:
+            x, y = y, x
+        self.__parent[y] = x
+        self.__size[x] += self.__size[y]
+        del self.__size[y]
+        self.__count -= 1
+        return True
+
+    def connected(self, x, y):
+        return self.find(x) == self.find(y)
+
+    def count(self):
+        """number of disjoint sets"""
+        return self.__count
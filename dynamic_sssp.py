@@ -0,0 +1,232 @@
+import heapq
+import math
+
+from graph import GraphException
+from graph_tasks import _modulus, _path_counts, _weight
+
+
+class DynamicSSSP():
+    """distances and counts of shortest paths from a fixed source (as in
+    task7), kept up to date while the graph changes.
+
+    Subscribes to the graph's changes and repairs only the vertices whose
+    distance or count is affected, Ramalingam-Reps style: an inserted edge
+    runs Dijkstra from its head over the vertices it improves, a removed
+    shortest path edge finds the vertices left without any shortest path
+    predecessor and recomputes just those. Changes the repair can't
+    handle (negative edges, zero-weight cycles, removed source) make the
+    next query recompute everything, raising what task7 would raise.
+    """
+
+    def __init__(self, gr, source, *, mod=None):
+        if not gr.is_weighted():
+            raise GraphException("This task requires a weighted graph!")
+        if source not in gr.get_vertices():
+            raise GraphException("No such vertex!")
+
+        self.__gr = gr
+        self.__source = source
+        self.__mod = _modulus(mod)
+        self.__typed = gr.get_weight_type() is not None
+        self.__dist = {}  # reachable vertex -> distance
+        self.__ways = {}  # reachable vertex -> count of shortest paths
+        self.__stale = True
+        self.__refresh()
+        gr.subscribe(self.__changed)
+
+    def close(self):
+        """stop following changes of the graph"""
+        self.__gr.unsubscribe(self.__changed)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def distance(self, v):
+        self.__refresh()
+        self.__gr.get_adjacent(v)  # raises for a missing vertex
+        return self.__dist.get(v, math.inf)
+
+    def count(self, v):
+        self.__refresh()
+        self.__gr.get_adjacent(v)
+        return self.__ways.get(v, 0)
+
+    def ways(self):
+        """{vertex: count of shortest paths}, same as task7"""
+        self.__refresh()
+        return {v: self.__ways.get(v, 0) for v in self.__gr.get_vertices()}
+
+    def __refresh(self):
+        if not self.__stale:
+            return
+        if self.__source not in self.__gr.get_vertices():
+            raise GraphException("No such vertex!")
+        d, ways = _path_counts(self.__gr, self.__source, self.__mod)
+        self.__dist = d
+        self.__ways = {v: ways[v] for v in d}
+        self.__stale = False
+
+    def __changed(self, event, *args):
+        if self.__stale:
+            return
+        try:
+            if event == "add_edge":
+                self.__inserted(*args)
+                if not self.__gr.is_directed():
+                    self.__inserted(args[1], args[0], args[2])
+            elif event == "remove_edge":
+                self.__removed(*args)
+                if not self.__gr.is_directed():
+                    self.__removed(args[1], args[0], args[2])
+            elif event == "remove_vertex":
+                if args[0] == self.__source:
+                    self.__stale = True
+        except GraphException:
+            self.__stale = True
+
+    def __price(self, w):
+        w = w if self.__typed else _weight(w)
+        if w < 0:
+            raise GraphException("Graph has a negative edge!")
+        return w
+
+    def __preds(self, y):
+        """predecessors of y on its shortest paths"""
+        d = self.__dist
+        dy = d[y]
+        return [x for x in self.__gr.get_incoming(y) if x in d and
+                d[x] + self.__price(self.__gr.get_edge_attr(x, y)) == dy]
+
+    def __succs(self, x):
+        """successors of x whose shortest paths may go through x"""
+        d = self.__dist
+        dx = d[x]
+        return [y for y, w in self.__gr.get_adjacent(x).items() if y in d
+                and dx + self.__price(w) == d[y]]
+
+    def __inserted(self, x, y, w):
+        d = self.__dist
+        w = self.__price(w)
+        if x not in d:
+            return
+        nd = d[x] + w
+        dy = d.get(y, math.inf)
+        if nd > dy:
+            return
+        if nd == dy:  # only a new way, distances stay
+            self.__recount([y])
+            return
+
+        # Dijkstra from y over the vertices whose distance drops
+        d[y] = nd
+        improved = [y]
+        heap = [(nd, y)]
+        while heap:
+            dz, z = heapq.heappop(heap)
+            if dz > d[z]:  # stale entry
+                continue
+            for t, wt in self.__gr.get_adjacent(z).items():
+                nt = dz + self.__price(wt)
+                if nt < d.get(t, math.inf):
+                    d[t] = nt
+                    improved.append(t)
+                    heapq.heappush(heap, (nt, t))
+        self.__recount(improved)
+
+    def __removed(self, x, y, w):
+        d = self.__dist
+        w = self.__price(w)
+        if x not in d or y not in d or d[x] + w != d[y] or \
+                y == self.__source:
+            return  # wasn't on any shortest path
+        if self.__preds(y):  # other shortest paths remain
+            self.__recount([y])
+            return
+
+        # vertices all of whose shortest path predecessors lost theirs;
+        # every old successor of them may lose ways, so recount those too
+        lost = {y}
+        order = [y]
+        left = {}  # vertex -> count of predecessors not yet lost
+        touched = []
+        for z in order:  # grows while iterating
+            for t in self.__succs(z):
+                if t in lost:
+                    continue
+                touched.append(t)
+                if t not in left:
+                    left[t] = len(self.__preds(t))
+                left[t] -= 1
+                if left[t] == 0:
+                    lost.add(t)
+                    order.append(t)
+
+        for z in order:
+            del d[z]
+            del self.__ways[z]
+        heap = []
+        for z in order:
+            best = math.inf
+            for p in self.__gr.get_incoming(z):
+                if p in d:
+                    best = min(best, d[p] + self.__price(
+                        self.__gr.get_edge_attr(p, z)))
+            if best < math.inf:
+                d[z] = best
+                heap.append((best, z))
+        heapq.heapify(heap)
+        while heap:
+            dz, z = heapq.heappop(heap)
+            if dz > d[z]:  # stale entry
+                continue
+            for t, wt in self.__gr.get_adjacent(z).items():
+                if t not in lost:
+                    continue
+                nt = dz + self.__price(wt)
+                if nt < d.get(t, math.inf):
+                    d[t] = nt
+                    heapq.heappush(heap, (nt, t))
+        self.__recount([z for z in order if z in d] +
+                       [t for t in touched if t in d])
+
+    def __recount(self, seeds):
+        """recount ways of seeds and everything after them on shortest
+        paths, in topological order of the shortest path DAG"""
+        region = set()
+        stack = list(seeds)
+        while stack:
+            z = stack.pop()
+            if z not in region:
+                region.add(z)
+                stack.extend(self.__succs(z))
+
+        ways = self.__ways
+        mod = self.__mod
+        indeg = dict.fromkeys(region, 0)
+        for z in region:
+            ways[z] = 1 if z == self.__source else 0
+            for p in self.__preds(z):
+                if p in region:
+                    indeg[z] += 1
+                elif z == self.__source:
+                    raise GraphException("zero-weight cycle")
+                else:
+                    ways[z] += ways[p]
+            if mod is not None:
+                ways[z] %= mod
+
+        queue = [z for z in region if indeg[z] == 0]
+        for z in queue:  # grows while iterating
+            for t in self.__succs(z):
+                if t in region:
+                    ways[t] += ways[z]
+                    if mod is not None:
+                        ways[t] %= mod
+                    indeg[t] -= 1
+                    if indeg[t] == 0:
+                        queue.append(t)
+        if len(queue) != len(region):
+            raise GraphException("zero-weight cycle")
@@ -1,13 +1,35 @@
 #!/usr/bin/env python3
 
+import argparse
+from collections.abc import Mapping
+from decimal import Decimal
+import functools
+import inspect
+import json
+import math
 import os
 import os.path
-from graph import Graph, GraphException, GraphOperationException
+import sys
+from graph import (Graph, GraphException, GraphOperationException,
+                   NegativeCycleException, PROGRESS_LINES)
+from binary_graph import open_binary, save_binary
+from task_cache import TaskCache
+from instrument import Instrumentation
 from graph_tasks import (task1, task2, task3,
                          task4, task5, task6,
                          task7, task8, task9)
 
 tasks = (task1, task2, task3, task4, task5, task6, task7, task8, task9)
+weight_types = {"int": int, "float": float, "decimal": Decimal}
+cache = TaskCache()  # repeated solves on an unchanged graph are instant
+stats = False  # measure every solve
+profile = None  # profile every solve: "" to print, or file to dump to
+
+
+def load_progress(lines, seconds):
+    if lines >= PROGRESS_LINES:  # don't bother with small files
+        print(f"... {lines} lines read, "
+              f"{lines / max(seconds, 1e-9):.0f} lines/s")
 
 
 def clear():
@@ -28,8 +50,10 @@ cmds = {
     "add_edge": ["v1", "v2", "?price"],
     "remove_vertex": ["v"],
     "remove_edge": ["v1", "v2"],
-    "load": ["in_file"],
+    "load": ["in_file", "?weight_type"],
     "save": [],
+    "load_bin": ["in_file"],
+    "save_bin": [],
     "copy": ["copy_name"],
     "create": ["attrib1", "attrib2", "name"],
     "to": ["to_name"],
@@ -37,7 +61,10 @@ cmds = {
     "delete": [],
     "get_graphs": [],
     "get_tasks": [],
-    "solve": ["task_num"],
+    "solve": ["task_num", "?engine"],
+    "cache": ["?clear"],
+    "stats": ["?on_off"],
+    "profile": ["?out_file"],
     "exit": []
 }
 
@@ -54,10 +81,262 @@ def commands():
         print(cmd, *cmds[cmd])
 
 
+# Batch mode: commands come from a file or stdin, one per line, either
+# as typed in the shell (solve takes its arguments on the same line,
+# options as key=value) or as JSON objects
+#   {"id": 1, "graph": "map", "cmd": "solve", "args": [7, "a"],
+#    "options": {"mod": 1000}}
+# where "graph" switches to that graph first. Every request gets one JSON
+# line back: {"id": ..., "ok": true, "result": ...} or "ok": false with
+# an "error".
+
+class RequestError(Exception):
+    pass
+
+
+batch_cmds = set(cmds) - {"clear", "cmds", "profile"}
+warm_graphs = {}  # (path, weight_type) -> (mtime, pristine graph)
+
+
+def load_graph(fname, weight_type, warm):
+    """with warm=True every file is read once (again if it changes),
+    loads get copy-on-write copies of it"""
+    if not warm:
+        return Graph(fname, weight_type=weight_type)
+    key = (os.path.abspath(fname), weight_type)
+    mtime = os.stat(fname).st_mtime_ns
+    if key not in warm_graphs or warm_graphs[key][0] != mtime:
+        warm_graphs[key] = (mtime, Graph(fname, weight_type=weight_type))
+    return Graph(warm_graphs[key][1])
+
+
+def jsonable(obj):
+    if isinstance(obj, Mapping):
+        return {str(k): jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, (set, frozenset)):
+        return sorted((jsonable(x) for x in obj), key=str)
+    if isinstance(obj, (list, tuple)):
+        return [jsonable(x) for x in obj]
+    if isinstance(obj, float) and not math.isfinite(obj):
+        return str(obj)
+    if obj is None or isinstance(obj, (str, int, float)):
+        return obj
+    return str(obj)
+
+
+def option_value(text):
+    """value of key=value in a script line: JSON if it parses
+    (numbers, true, ...), the text itself otherwise"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def batch_solve(gr, task_number, args, options):
+    if not 1 <= int(task_number) <= len(tasks):
+        raise RequestError("No such task!")
+    task = tasks[int(task_number) - 1]
+    argc = task.__code__.co_argcount
+    if len(args) != argc - 1:
+        raise RequestError("Task takes: " +
+                           " ".join(task.__code__.co_varnames[1:argc]))
+    params = inspect.signature(task).parameters
+    for key in options:
+        if key not in params or \
+                params[key].kind is not inspect.Parameter.KEYWORD_ONLY:
+            raise RequestError(f"Unknown option {key}!")
+
+    args = [str(x) for x in args]  # as if typed
+    in_place = bool(options.get("in_place"))
+    if stats:
+        with Instrumentation(gr) as ins:
+            res = task(ins.graph, *args, **options)
+        measured = {"seconds": ins.seconds, "peak_bytes": ins.peak_bytes,
+                    "edge_visits": ins.graph.edge_visits,
+                    "calls": dict(ins.graph.calls)}
+    elif in_place:  # changes the graph, nothing to cache
+        task(gr, *args, **options)
+        measured = None
+    else:
+        res = cache.call(task, gr, *args, **options)
+        measured = None
+    if in_place:  # the answer is the current graph itself
+        res = {"graph": current}
+    elif isinstance(res, Graph):
+        graphs[f"task{task_number}"] = res
+        res = {"graph": f"task{task_number}"}
+    return res, measured
+
+
+def run_request(cmd, args, options, warm):
+    """result of one batch command, raises on failure"""
+    global current, stats
+    if cmd not in batch_cmds:
+        raise RequestError("Unknown command!")
+    if cmd == "solve":
+        if len(args) == 0:
+            raise RequestError(f"Wrong usage of command \"{cmd}\"!")
+        return batch_solve(graphs[current], args[0], args[1:], options)
+    if options:
+        raise RequestError(f"Command \"{cmd}\" takes no options!")
+    args = [str(x) for x in args]
+    if not test_args(cmd, args):
+        raise RequestError(f"Wrong usage of command \"{cmd}\"!")
+
+    gr = graphs[current]
+    res = None
+    if cmd == "print":
+        directed = gr.is_directed()
+        edges = []
+        printed = set()
+        for x in gr.get_vertices():
+            for y, price in gr.get_adjacent(x).items():
+                if not directed and (y, x) in printed:
+                    continue
+                edges.append((x, y, price) if gr.is_weighted() else (x, y))
+                printed.add((x, y))
+        res = {"directed": directed, "weighted": gr.is_weighted(),
+               "vertices": gr.get_vertices(), "edges": edges}
+    elif cmd in ("add_vertex", "remove_vertex", "add_edge", "remove_edge"):
+        getattr(gr, cmd)(*args)
+    elif cmd == "load":
+        name, *weight_type = args
+        if len(weight_type) > 0 and weight_type[0] not in weight_types:
+            raise RequestError("Weight type should be one of: " +
+                               " ".join(weight_types))
+        weight_type = weight_types[weight_type[0]] if weight_type else None
+        graphs[name] = load_graph(name + ".txt", weight_type, warm)
+        res = {"graph": name, "vertices": len(graphs[name].get_vertices())}
+    elif cmd == "load_bin":
+        [name] = args
+        graphs[name] = open_binary(name + ".grb")
+        res = {"graph": name, "vertices": graphs[name].vertex_count()}
+    elif cmd == "save":  # no questions asked, files are overwritten
+        gr.save(current + ".txt")
+        res = {"file": current + ".txt"}
+    elif cmd == "save_bin":
+        save_binary(gr, current + ".grb")
+        res = {"file": current + ".grb"}
+    elif cmd in ("copy", "create"):
+        *attribs, name = args
+        if name in graphs:
+            raise RequestError("Name already presents in list!")
+        graphs[name] = Graph(gr) if cmd == "copy" else Graph(attribs)
+    elif cmd == "to":
+        if args[0] not in graphs:
+            raise RequestError("No such graph!")
+        current = args[0]
+    elif cmd == "rename":
+        if current == default_name:
+            raise RequestError("Cannot rename default graph!")
+        if args[0] in graphs:
+            raise RequestError("New name already presents in list!")
+        graphs[args[0]] = graphs.pop(current)
+        current = args[0]
+    elif cmd == "delete":
+        if current == default_name:
+            raise RequestError("Cannot delete default graph!")
+        del graphs[current]
+        current = default_name
+    elif cmd == "get_graphs":
+        res = list(graphs)
+    elif cmd == "get_tasks":
+        res = [task.__doc__ for task in tasks]
+    elif cmd == "cache":
+        if len(args) > 0:
+            if args[0] != "clear":
+                raise RequestError("Only \"cache clear\" is known!")
+            cache.clear()
+        res = {"entries": len(cache), "bytes": cache.size(),
+               "hits": cache.hits, "misses": cache.misses}
+    elif cmd == "stats":
+        if len(args) > 0 and args[0] not in ("on", "off"):
+            raise RequestError("Use \"stats on\" or \"stats off\"!")
+        stats = args[0] == "on" if len(args) > 0 else not stats
+        res = stats
+    return res, None
+
+
+def parse_request(line, number):
+    """(id, graph or None, cmd, args, options) of a script or JSON line"""
+    if line.startswith("{"):
+        req = json.loads(line)
+        if not isinstance(req, dict) or "cmd" not in req:
+            raise RequestError("Request should be an object with \"cmd\"!")
+        return (req.get("id", number), req.get("graph"), req["cmd"],
+                list(req.get("args", [])), dict(req.get("options", {})))
+    cmd, *words = line.split()
+    args = []
+    options = {}
+    for word in words:
+        key, eq, value = word.partition("=")
+        if cmd == "solve" and eq and key.isidentifier():
+            options[key] = option_value(value)
+        else:
+            args.append(word)
+    return number, None, cmd, args, options
+
+
+def batch(lines, out, warm=False, flush=False):
+    """run requests, write one JSON result per request"""
+    global current
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if len(line) == 0 or line.startswith("#"):
+            continue
+        answer = {"id": number}
+        try:
+            answer["id"], graph, cmd, args, options = \
+                parse_request(line, number)
+            if cmd == "exit":
+                break
+            if graph is not None:
+                if graph not in graphs:
+                    raise RequestError("No such graph!")
+                current = graph
+            res, measured = run_request(cmd, args, options, warm)
+            answer["ok"] = True
+            answer["result"] = jsonable(res)
+            if measured is not None:
+                answer["stats"] = measured
+        except FileNotFoundError:
+            answer["ok"] = False
+            answer["error"] = "No such file!"
+        except NegativeCycleException as e:
+            answer["ok"] = False
+            answer["error"] = str(e)
+            answer["cycle"] = e.cycle
+        except Exception as e:  # a bad request mustn't end the batch
+            answer["ok"] = False
+            answer["error"] = str(e) or type(e).__name__
+        out.write(json.dumps(answer) + "\n")
+        if flush:
+            out.flush()
+
+
 default_name = "default"
 graphs = {default_name: Graph()}
 current = default_name
 
+parser = argparse.ArgumentParser(
+    description="Play with graphs, interactively unless --batch is given")
+parser.add_argument("--batch", metavar="FILE",
+                    help="run commands or JSON requests from FILE "
+                    "(- for stdin) without prompts, printing one JSON "
+                    "result per line")
+parser.add_argument("--warm", action="store_true",
+                    help="in batch mode read each graph file once, "
+                    "later loads get a copy")
+options = parser.parse_args()
+if options.batch is not None:
+    if options.batch == "-":  # answers are awaited line by line
+        batch(sys.stdin, sys.stdout, options.warm, flush=True)
+    else:
+        with open(options.batch) as f:
+            batch(f, sys.stdout, options.warm)
+    sys.exit()
+
 print("Please type \"cmds\" to see availible commands")
 
 while True:
@@ -134,33 +413,56 @@ while True:
         except GraphOperationException as e:
             print(e)
     elif cmd == "load":
-        [name] = args
+        name, *weight_type = args
+        if len(weight_type) > 0 and weight_type[0] not in weight_types:
+            print("Weight type should be one of:", *weight_types)
+            continue
+        weight_type = weight_types[weight_type[0]] if weight_type else None
         try:
             fname = name + ".txt"
-            graphs[name] = Graph(fname)
+            graphs[name] = Graph(fname, weight_type=weight_type,
+                                 progress=load_progress)
             print("Loaded", fname)
         except FileNotFoundError:
             print("No such file!")
         except GraphException as e:
             print("File is invalid:", e)
-    elif cmd == "save":
-        fname = current + ".txt"
-        if os.path.exists(fname):
-            print(f"File \"{fname}\" exists. Overwrite it? (y/n)")
-            try:
-                ans = input()
-                if ans == 'y':
-                    gr.save(fname)
-                    print("Wrote", fname)
-                elif ans == 'n':
-                    print("Didn't save the graph")
-                else:
-                    print("I'll count it as no")
-            except EOFError:
-                print("No input... Not saving then")
+    elif cmd == "load_bin":
+        [name] = args
+        try:
+            fname = name + ".grb"
+            graphs[name] = open_binary(fname)  # read-only, memory-mapped
+            print("Mapped", fname)
+        except FileNotFoundError:
+            print("No such file!")
+        except GraphException as e:
+            print("File is invalid:", e)
+    elif cmd in ("save", "save_bin"):
+        if cmd == "save":
+            fname = current + ".txt"
+            write = gr.save
         else:
-            gr.save(fname)
-            print("Wrote", fname)
+            fname = current + ".grb"
+            write = functools.partial(save_binary, gr)
+        try:
+            if os.path.exists(fname):
+                print(f"File \"{fname}\" exists. Overwrite it? (y/n)")
+                try:
+                    ans = input()
+                    if ans == 'y':
+                        write(fname)
+                        print("Wrote", fname)
+                    elif ans == 'n':
+                        print("Didn't save the graph")
+                    else:
+                        print("I'll count it as no")
+                except EOFError:
+                    print("No input... Not saving then")
+            else:
+                write(fname)
+                print("Wrote", fname)
+        except GraphException as e:
+            print(e)
     elif cmd == "copy":
         [cname] = args
         if cname in graphs:
@@ -204,8 +506,14 @@ while True:
         for i, task in enumerate(tasks, 1):
             print(f"Task {i}:", task.__doc__)
     elif cmd == "solve":
-        [task_number] = args
+        task_number, *engine = args
         task = tasks[int(task_number) - 1]
+        opts = {}
+        if len(engine) > 0:
+            if "engine" not in inspect.signature(task).parameters:
+                print("This task has only one engine!")
+                continue
+            opts["engine"] = engine[0]
         argc = task.__code__.co_argcount
         if argc > 1:
             print("Please, provide:")
@@ -218,7 +526,13 @@ while True:
             if len(more_args) != argc - 1:
                 print("Invalid arguments!")
                 continue
-            res = task(gr, *more_args)
+            if stats or profile is not None:  # measured, not cached
+                with Instrumentation(gr, profile=profile is not None,
+                                     profile_path=profile or None) as ins:
+                    res = task(ins.graph, *more_args, **opts)
+                print(ins.report())
+            else:
+                res = cache.call(task, gr, *more_args, **opts)
             if isinstance(res, Graph):
                 graphs[f"task{task_number}"] = res
                 print(f"Now go to graph task{task_number}")
@@ -227,7 +541,35 @@ while True:
                 print(res)
         except EOFError:
             print("No input... No answer!!!")
+        except NegativeCycleException as e:
+            print(e)
+            print("Cycle:", " ".join(e.cycle))
         except GraphException as e:
             print(e)
+    elif cmd == "cache":
+        if len(args) > 0:
+            if args[0] != "clear":
+                print("Only \"cache clear\" is known!")
+                continue
+            cache.clear()
+        print(f"Cached results: {len(cache)}, "
+              f"~{cache.size() / 2 ** 20:.1f} MiB, "
+              f"hits: {cache.hits}, misses: {cache.misses}")
+    elif cmd == "stats":
+        if len(args) > 0 and args[0] not in ("on", "off"):
+            print("Use \"stats on\" or \"stats off\"!")
+            continue
+        stats = args[0] == "on" if len(args) > 0 else not stats
+        print("Solves are measured" if stats else "Solves aren't measured")
+    elif cmd == "profile":
+        if len(args) == 0:
+            profile = ""
+            print("Solves are profiled")
+        elif args[0] == "off":
+            profile = None
+            print("Solves aren't profiled")
+        else:
+            profile = args[0]
+            print("Solves are profiled to", profile)
     elif cmd == "exit":
         break
@@ -1,6 +1,12 @@
 
 from collections.abc import Iterable
+from array import array
+from decimal import Decimal
+from types import MappingProxyType
 import copy
+import gzip
+import itertools
+import time
 
 
 class GraphException(Exception):
@@ -11,7 +17,106 @@ class GraphOperationException(GraphException):
     pass
 
 
-class Graph():
+class NegativeCycleException(GraphException):
+    """cycle holds its vertices in edge order"""
+
+    def __init__(self, message, cycle):
+        super().__init__(message)
+        self.cycle = cycle
+
+
+WEIGHT_TYPES = (int, float, Decimal)
+PROGRESS_LINES = 1 << 20  # loading progress is reported this often
+IO_BUFFER = 1 << 20
+
+# versions are drawn from one counter, so a version number identifies
+# both the graph and its state
+_versions = itertools.count(1)
+
+
+def _convert_price(price, weight_type):
+    if weight_type is None or type(price) is weight_type:
+        return price
+    try:
+        if weight_type is int and not isinstance(price, (str, int)):
+            raise TypeError("Only exact integers are allowed!")
+        return weight_type(price)
+    except (TypeError, ValueError, ArithmeticError):
+        raise GraphOperationException((f"Price {price} isn't "
+                                       "a valid " + weight_type.__name__))
+
+
+def open_text(path, mode):
+    """open a graph text file, (de)compressing .gz and .zst files"""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t")
+    if path.endswith(".zst"):
+        try:
+            from compression import zstd  # Python 3.14+
+        except ImportError:
+            try:
+                import zstandard as zstd
+            except ImportError:
+                raise GraphException(("zstd needs Python 3.14 or "
+                                      "the zstandard package!"))
+        return zstd.open(path, mode + "t")
+    return open(path, mode, buffering=IO_BUFFER)
+
+
+class _Indexed():
+    """Indexes of a graph (Graph or FrozenGraph), built when first asked
+    for and cached until closed. Indexes of a Graph follow its changes."""
+
+    def _init_indexes(self):
+        self.__indexes = {}  # "connectivity" or ("degree", incoming)
+
+    def connectivity(self):
+        """index of connected components"""
+        index = self.__indexes.get("connectivity")
+        if index is None:
+            from connectivity import ConnectivityIndex  # imports graph
+            index = self.__indexes["connectivity"] = ConnectivityIndex(self)
+        return index
+
+    def degree_index(self, *, incoming=False):
+        """vertices sorted by outgoing (incoming) degree"""
+        key = ("degree", incoming)
+        index = self.__indexes.get(key)
+        if index is None:
+            from degree_index import DegreeIndex  # imports graph
+            index = self.__indexes[key] = DegreeIndex(self,
+                                                      incoming=incoming)
+        return index
+
+    def _drop_index(self, index):
+        """forget a closed index, the next request builds a new one"""
+        for key, cached in list(self.__indexes.items()):
+            if cached is index:
+                del self.__indexes[key]
+
+
+class GraphIndex():
+    """Base of indexes kept by _Indexed: follows changes of a Graph
+    through subscribe (frozen graphs never change), subclasses handle
+    them in _changed."""
+
+    def __init__(self, gr):
+        self.__gr = gr
+        if isinstance(gr, Graph):
+            gr.subscribe(self._changed)
+
+    def close(self):
+        """stop following changes of the graph, which then builds a new
+        index when asked for one"""
+        self.__gr._drop_index(self)
+        if isinstance(self.__gr, Graph):
+            self.__gr.unsubscribe(self._changed)
+
+    def _changed(self, event, *args):
+        pass
+
+
+class Graph(_Indexed):
     def __set_attribs(self, attribs):
         self.__attributes = {}
         for atr in attribs:
@@ -33,47 +138,99 @@ class Graph():
                 raise GraphException(("One of atttributes "
                                       "wasn't unrecognized: " + atr))
 
-    def __load(self, file):
-        self.__set_attribs(file.readline().split())
+    def __parse(self, file, progress):
+        """stream edges of file lines, adding lone vertices on the way"""
+        start = time.perf_counter()
+        i = 1
         for i, line in enumerate(file, 2):
             a = line.split()
-            if len(a) == 0:
-                continue
-            if len(a) == 1:
+            if len(a) in [2, 3]:
+                yield a
+            elif len(a) == 1:
                 self.add_vertex(a[0])
-            elif len(a) in [2, 3]:
-                self.add_edge(*a)
-            else:
+            elif len(a) != 0:
                 raise GraphException(("Format of line "
                                       f"{i} is incorrect!"))
+            if progress is not None and i % PROGRESS_LINES == 0:
+                progress(i, time.perf_counter() - start)
+        if progress is not None:
+            progress(i, time.perf_counter() - start)
+
+    def __load(self, file, progress=None):
+        self.__set_attribs(file.readline().split())
+        self.add_edges_from(self.__parse(file, progress))
 
-    def __init__(self, arg=None):
+    def __init__(self, arg=None, *, weight_type=None, progress=None):
+        """weight_type (int, float or Decimal) converts prices once on
+        insertion, by default they are kept as given (strings from files).
+        progress(lines_read, seconds) is called while loading a file."""
+        if weight_type is not None and weight_type not in WEIGHT_TYPES:
+            raise GraphException("Weight type should be one of: " +
+                                 ", ".join(t.__name__ for t in WEIGHT_TYPES))
+        self.__weight_type = weight_type
         self.__vertices = {}
+        # reverse adjacency: vertex -> set of vertices having an edge to it
+        self.__incoming = {}
+        # vertices whose rows aren't shared with copies (copy-on-write)
+        self.__owned = set()
+        self.__version = next(_versions)
+        # callbacks told about every change, copies don't inherit them
+        self.__subscribers = []
+        self._init_indexes()
         if arg is None:
             self.__set_attribs(("directed", "weighted"))
         elif isinstance(arg, str):
-            with open(arg) as f:
-                self.__load(f)
+            with open_text(arg, "r") as f:
+                self.__load(f, progress)
         elif isinstance(arg, Graph):
+            # rows are shared, both graphs clone a row before changing it
             self.__attributes = copy.deepcopy(arg.__attributes)
-            self.__vertices = copy.deepcopy(arg.__vertices)
+            self.__vertices = dict(arg.__vertices)
+            self.__incoming = dict(arg.__incoming)
+            arg.__owned = set()
+            if weight_type is None:
+                self.__weight_type = arg.__weight_type
+            elif weight_type is not arg.__weight_type and self.is_weighted():
+                for v in self.__vertices:
+                    self.__own(v)
+                    row = self.__vertices[v]
+                    for u in row:
+                        row[u] = _convert_price(row[u], weight_type)
+        elif isinstance(arg, FrozenGraph):
+            if weight_type is None:
+                self.__weight_type = arg.get_weight_type()
+            self.__set_attribs(arg.list_attributes())
+            for v in arg.get_vertices():
+                self.add_vertex(v)
+            for v in arg.get_vertices():
+                for u, price in arg.get_adjacent(v).items():
+                    if not self.exists_edge(v, u):
+                        self.add_edge(v, u, price)
         elif isinstance(arg, Iterable):
             self.__set_attribs(arg)
         else:
             raise GraphException(("Constructor accepts either "
                                   "nothing (None), path to file "
-                                  ", another graph or "
+                                  ", another (frozen) graph or "
                                   "iterable with attributes!"))
 
     @staticmethod
-    def load_from_file(file):
-        gr = Graph()
-        gr.__load(file)
+    def load_from_file(file, *, weight_type=None, progress=None):
+        gr = Graph(weight_type=weight_type)
+        gr.__load(file, progress)
         return gr
 
     def is_weighted(self):
         return self.__attributes["weighted"]
 
+    def get_weight_type(self):
+        """type all prices are stored as, None if kept as given"""
+        return self.__weight_type
+
+    def get_version(self):
+        """number that grows with every change, unique among graphs"""
+        return self.__version
+
     def is_directed(self):
         return self.__attributes["directed"]
 
@@ -89,35 +246,94 @@ class Graph():
         return set(self.__vertices.keys())
 
     def get_adjacent(self, v):
+        """read-only live view of {neighbour: price}, no copying
+        (after copying the graph it may show the row as it was then)"""
+        if v not in self.__vertices:
+            raise GraphException("No such vertex!")
+
+        return MappingProxyType(self.__vertices[v])
+
+    def copy_adjacent(self, v):
+        """independent {neighbour: price} dict safe to modify"""
+        if v not in self.__vertices:
+            raise GraphException("No such vertex!")
+
+        return dict(self.__vertices[v])
+
+    def get_outdeg(self, v):
         if v not in self.__vertices:
             raise GraphException("No such vertex!")
 
-        return copy.deepcopy(self.__vertices[v])
+        return len(self.__vertices[v])
 
     def get_incdeg(self, v):
-        return len({u for u in self.__vertices if v in self.__vertices[u]})
+        if v not in self.__incoming:
+            raise GraphException("No such vertex!")
+
+        return len(self.__incoming[v])
+
+    def get_incoming(self, v):
+        if v not in self.__incoming:
+            raise GraphException("No such vertex!")
+
+        return set(self.__incoming[v])
+
+    def subscribe(self, callback):
+        """call callback(event, *args) after every change of the graph:
+        ("add_vertex", x), ("remove_vertex", x), ("add_edge", x, y, price)
+        or ("remove_edge", x, y, price); an undirected edge is one event.
+        Removing a vertex first removes its edges one by one."""
+        self.__subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self.__subscribers.remove(callback)
+
+    def __notify(self, *event):
+        for callback in list(self.__subscribers):
+            callback(*event)
 
     def add_vertex(self, x):
         if x in self.__vertices:
             raise GraphOperationException("Tried to add existing vertex!")
 
+        self.__version = next(_versions)
         self.__vertices[x] = {}
+        self.__incoming[x] = set()
+        self.__owned.add(x)
+        if self.__subscribers:
+            self.__notify("add_vertex", x)
+
+    def __own(self, x):
+        """clone rows of x if they're shared with a copy of the graph"""
+        if x not in self.__owned:
+            self.__vertices[x] = dict(self.__vertices[x])
+            self.__incoming[x] = set(self.__incoming[x])
+            self.__owned.add(x)
 
     def remove_vertex(self, x):
         if x not in self.__vertices:
             raise GraphOperationException(
                 "Tried to delete nonexistant vertex!")
 
-        for v in self.__vertices:
-            if v != x and x in self.__vertices[v]:
+        self.__version = next(_versions)
+        for v in list(self.__incoming[x]):
+            if v != x:
                 self.remove_edge(v, x)
+        for u in list(self.__vertices[x]):
+            self.remove_edge(x, u)
         del self.__vertices[x]
+        del self.__incoming[x]
+        self.__owned.discard(x)
+        if self.__subscribers:
+            self.__notify("remove_vertex", x)
 
     def add_edge(self, x, y, price=None):
         if (price is not None) != (self.is_weighted()):
             raise GraphOperationException(("Tried to insert edge "
                                            f"with price {price}, "
                                            "which is unallowed!"))
+        if price is not None:
+            price = _convert_price(price, self.__weight_type)
         if x not in self.__vertices:
             self.add_vertex(x)
         if y not in self.__vertices:
@@ -126,41 +342,315 @@ class Graph():
         if y in self.__vertices[x]:
             raise GraphOperationException("Tried to add an existing edge!")
 
+        self.__version = next(_versions)
+        self.__own(x)
+        self.__own(y)
         self.__vertices[x][y] = price
+        self.__incoming[y].add(x)
         if not self.is_directed():
             self.__vertices[y][x] = price
+            self.__incoming[x].add(y)
+        if self.__subscribers:
+            self.__notify("add_edge", x, y, price)
+
+    def add_edges_from(self, edges):
+        """add many (x, y) or (x, y, price) edges, same rules as add_edge"""
+        weighted = self.is_weighted()
+        directed = self.is_directed()
+        weight_type = self.__weight_type
+        vertices = self.__vertices
+        incoming = self.__incoming
+        owned = self.__owned
+        subscribers = self.__subscribers
+        self.__version = next(_versions)
+        for edge in edges:
+            x, y = edge[0], edge[1]
+            price = edge[2] if len(edge) > 2 else None
+            if (price is not None) != weighted:
+                raise GraphOperationException(("Tried to insert edge "
+                                               f"with price {price}, "
+                                               "which is unallowed!"))
+            if price is not None:
+                price = _convert_price(price, weight_type)
+            if x not in vertices:
+                self.add_vertex(x)
+            if y not in vertices:
+                self.add_vertex(y)
+
+            if y in vertices[x]:
+                raise GraphOperationException(
+                    "Tried to add an existing edge!")
+
+            if x not in owned:
+                self.__own(x)
+            if y not in owned:
+                self.__own(y)
+            vertices[x][y] = price
+            incoming[y].add(x)
+            if not directed:
+                vertices[y][x] = price
+                incoming[x].add(y)
+            if subscribers:
+                self.__notify("add_edge", x, y, price)
 
     def remove_edge(self, x, y):
         if x not in self.__vertices or y not in self.__vertices[x]:
             raise GraphOperationException(("Tried to remove "
                                            "nonexistant edge!"))
 
-        del self.__vertices[x][y]
-        if not self.is_directed():
+        self.__version = next(_versions)
+        self.__own(x)
+        self.__own(y)
+        price = self.__vertices[x].pop(y)
+        self.__incoming[y].discard(x)
+        if not self.is_directed() and x != y:
             del self.__vertices[y][x]
+            self.__incoming[x].discard(y)
+        if self.__subscribers:
+            self.__notify("remove_edge", x, y, price)
 
     def __list_attributes(self):
         return set(map(lambda x: ("" if x[1] else "not_") + x[0],
                        self.__attributes.items()))
 
-    def save(self, path):
-        isolated = set(self.__vertices.keys())
-        buff = []
-        appended = set()
-        for v in self.__vertices:
-            for u in self.__vertices[v]:
-                if not self.is_directed() and (u, v) in appended:
+    def list_attributes(self):
+        return self.__list_attributes()
+
+    def freeze(self):
+        """immutable compact (CSR) snapshot of the graph"""
+        return FrozenGraph(self)
+
+    def __edge_lines(self):
+        directed = self.is_directed()
+        done = set()  # vertices whose undirected edges are all written
+        for v, row in self.__vertices.items():
+            for u, price in row.items():
+                if not directed and u in done:  # written as (u, v) already
                     continue
-                isolated.discard(v)
-                isolated.discard(u)
-                price = self.__vertices[v][u]
                 if price is None:
-                    buff.append(f"{v} {u}")
+                    yield f"{v} {u}\n"
                 else:
-                    buff.append(f"{v} {u} {price}")
-                appended.add((v, u))
-        with open(path, 'w') as f:
+                    yield f"{v} {u} {price}\n"
+            if not directed:
+                done.add(v)
+
+    def save(self, path):
+        """stream the graph to a text file, gzip/zstd compressed
+        if path ends with .gz/.zst"""
+        with open_text(path, "w") as f:
             f.write(" ".join(self.__list_attributes()) + "\n")
-            if len(isolated) > 0:
-                f.write("\n".join(isolated) + "\n")
-            f.write("\n".join(buff) + "\n")
+            f.writelines(f"{v}\n" for v, row in self.__vertices.items()
+                         if len(row) == 0 and len(self.__incoming[v]) == 0)
+            f.writelines(self.__edge_lines())
+
+
+def _as_int(w):
+    if isinstance(w, str):
+        return int(w)
+    if isinstance(w, int) and not isinstance(w, bool):
+        return w
+    raise TypeError("Not an integer weight!")
+
+
+def _pack_weights(prices, weight_type=None):
+    """pack prices into the most compact array that holds them exactly
+    (a tuple if none does, e.g. integers beyond int64),
+    returns it with the resulting weight type"""
+    prices = list(prices)
+    packings = {None: (("q", _as_int, int), ("d", float, float)),
+                int: (("q", _as_int, int),),
+                float: (("d", float, float),),
+                Decimal: ()}
+    for code, conv, packed_type in packings[weight_type]:
+        try:
+            return array(code, map(conv, prices)), packed_type
+        except OverflowError:  # exact integers too big for int64
+            break
+        except (ValueError, TypeError):
+            pass
+    return tuple(prices), weight_type
+
+
+class FrozenGraph(_Indexed):
+    """Read-only compressed sparse row (CSR) snapshot of a Graph.
+
+    Vertices get integer ids 0..n-1, edges of vertex i are stored in
+    targets[offsets[i]:offsets[i + 1]] with matching weights. Numeric
+    weights are packed into an int64 or double array, anything else is
+    kept as is (so are Decimal weights). Exposes the same read interface
+    as Graph, so every task can run against it, plus id based accessors
+    for hot loops.
+    """
+
+    def __init__(self, gr, *, sort=False):
+        """sort=True numbers vertices in order of their names"""
+        names = sorted(gr.get_vertices()) if sort else gr.get_vertices()
+        names = tuple(names)
+        index = {v: i for i, v in enumerate(names)}
+
+        offsets = array("q", [0])
+        targets = array("q")
+        prices = []
+        indeg = array("q", bytes(8 * len(names)))
+        for v in names:
+            adj = gr.get_adjacent(v)
+            for u in adj:
+                j = index[u]
+                targets.append(j)
+                indeg[j] += 1
+            prices.extend(adj.values())
+            offsets.append(len(targets))
+
+        weights = weight_type = None
+        if gr.is_weighted():
+            weights, weight_type = _pack_weights(prices,
+                                                 gr.get_weight_type())
+        self.__setup(gr.list_attributes(), names, index,
+                     offsets, targets, weights, weight_type, indeg)
+
+    @classmethod
+    def from_arrays(cls, attributes, names, index, offsets, targets,
+                    weights, weight_type, indeg):
+        """snapshot over ready CSR buffers (e.g. memory-mapped ones);
+        index only needs a get(name) method returning id or None"""
+        fr = cls.__new__(cls)
+        fr.__setup(attributes, names, index, offsets, targets,
+                   weights, weight_type, indeg)
+        return fr
+
+    def __setup(self, attributes, names, index, offsets, targets,
+                weights, weight_type, indeg):
+        self.__attributes = set(attributes)
+        self.__directed = "directed" in self.__attributes
+        self.__weighted = "weighted" in self.__attributes
+        self.__names = names
+        self.__index = index
+        self.__offsets = offsets
+        self.__targets = targets
+        self.__weights = weights
+        self.__weight_type = weight_type
+        self.__indeg = indeg
+        self.__version = next(_versions)
+        self._init_indexes()
+
+    # Graph compatible interface
+
+    def is_weighted(self):
+        return self.__weighted
+
+    def is_directed(self):
+        return self.__directed
+
+    def list_attributes(self):
+        return set(self.__attributes)
+
+    def get_weight_type(self):
+        return self.__weight_type
+
+    def get_version(self):
+        return self.__version
+
+    def exists_edge(self, x, y):
+        i = self.__index.get(x)
+        j = self.__index.get(y)
+        if i is None or j is None:
+            return False
+        return j in self.__targets[self.__offsets[i]:self.__offsets[i + 1]]
+
+    def get_edge_attr(self, v1, v2):
+        i = self.__index.get(v1)
+        j = self.__index.get(v2)
+        if i is not None and j is not None:
+            lo, hi = self.__offsets[i], self.__offsets[i + 1]
+            for e in range(lo, hi):
+                if self.__targets[e] == j:
+                    return None if self.__weights is None \
+                        else self.__weights[e]
+        raise GraphException("No such edge!")
+
+    def get_vertices(self):
+        return set(self.__names)
+
+    def get_adjacent(self, v):
+        i = self.__index.get(v)
+        if i is None:
+            raise GraphException("No such vertex!")
+
+        lo, hi = self.__offsets[i], self.__offsets[i + 1]
+        names = self.__names
+        if self.__weights is None:
+            return {names[j]: None for j in self.__targets[lo:hi]}
+        return {names[j]: w for j, w in
+                zip(self.__targets[lo:hi], self.__weights[lo:hi])}
+
+    def copy_adjacent(self, v):
+        return self.get_adjacent(v)
+
+    def get_outdeg(self, v):
+        i = self.__index.get(v)
+        if i is None:
+            raise GraphException("No such vertex!")
+        return self.__offsets[i + 1] - self.__offsets[i]
+
+    def get_incdeg(self, v):
+        i = self.__index.get(v)
+        if i is None:
+            raise GraphException("No such vertex!")
+        return self.__indeg[i]
+
+    def freeze(self):
+        return self
+
+    def add_vertex(self, x):
+        raise GraphOperationException("Frozen graph can't be changed!")
+
+    def remove_vertex(self, x):
+        raise GraphOperationException("Frozen graph can't be changed!")
+
+    def add_edge(self, x, y, price=None):
+        raise GraphOperationException("Frozen graph can't be changed!")
+
+    def add_edges_from(self, edges):
+        raise GraphOperationException("Frozen graph can't be changed!")
+
+    def remove_edge(self, x, y):
+        raise GraphOperationException("Frozen graph can't be changed!")
+
+    def save(self, path):
+        Graph(self).save(path)
+
+    # id based interface
+
+    def vertex_count(self):
+        return len(self.__names)
+
+    def edge_count(self):
+        """count of stored (directed) CSR entries"""
+        return len(self.__targets)
+
+    def index_of(self, v):
+        i = self.__index.get(v)
+        if i is None:
+            raise GraphException("No such vertex!")
+        return i
+
+    def name_of(self, i):
+        return self.__names[i]
+
+    def names(self):
+        return self.__names
+
+    def offsets(self):
+        return memoryview(self.__offsets).toreadonly()
+
+    def targets(self):
+        return memoryview(self.__targets).toreadonly()
+
+    def weights(self):
+        """packed weights (array view or tuple), None for unweighted"""
+        if self.__weights is None or isinstance(self.__weights, tuple):
+            return self.__weights
+        return memoryview(self.__weights).toreadonly()
+
+    def incdegs(self):
+        return memoryview(self.__indeg).toreadonly()
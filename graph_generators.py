@@ -0,0 +1,116 @@
+import random
+
+from graph import Graph
+
+# Seeded synthetic graphs: the same arguments always give the same graph.
+# Vertices are named "0" .. "n-1" and prices are strings, as if the graph
+# had been read from a file.
+
+
+def _graph(directed, weighted, weight_type):
+    return Graph((("" if directed else "not_") + "directed",
+                  ("" if weighted else "not_") + "weighted"),
+                 weight_type=weight_type)
+
+
+def _edges(gr, pairs, rnd, weighted, low, high):
+    if weighted:
+        gr.add_edges_from((str(x), str(y), str(rnd.randint(low, high)))
+                          for x, y in pairs)
+    else:
+        gr.add_edges_from((str(x), str(y)) for x, y in pairs)
+
+
+def erdos_renyi(n, m, *, directed=True, weighted=True, seed=0,
+                low=1, high=100, weight_type=None):
+    """n vertices and m edges picked uniformly at random"""
+    rnd = random.Random(seed)
+    gr = _graph(directed, weighted, weight_type)
+    for v in range(n):
+        gr.add_vertex(str(v))
+    m = min(m, n * n if directed else n * (n + 1) // 2)
+    pairs = set()
+    while len(pairs) < m:
+        x, y = rnd.randrange(n), rnd.randrange(n)
+        if not directed and x > y:
+            x, y = y, x
+        pairs.add((x, y))
+    _edges(gr, sorted(pairs), rnd, weighted, low, high)
+    return gr
+
+
+def grid(rows, cols, *, directed=False, weighted=True, seed=0,
+         low=1, high=100, weight_type=None):
+    """rows x cols lattice, each cell linked to its right and lower
+    neighbour (both ways if directed)"""
+    rnd = random.Random(seed)
+    gr = _graph(directed, weighted, weight_type)
+    for v in range(rows * cols):
+        gr.add_vertex(str(v))
+    pairs = []
+    for r in range(rows):
+        for c in range(cols):
+            v = r * cols + c
+            for u in ((v + 1,) if c + 1 < cols else ()) + \
+                    ((v + cols,) if r + 1 < rows else ()):
+                pairs.append((v, u))
+                if directed:
+                    pairs.append((u, v))
+    _edges(gr, pairs, rnd, weighted, low, high)
+    return gr
+
+
+def scale_free(n, k, *, directed=False, weighted=True, seed=0,
+               low=1, high=100, weight_type=None):
+    """Barabasi-Albert preferential attachment: every new vertex links
+    to k earlier ones chosen proportionally to their degree"""
+    rnd = random.Random(seed)
+    gr = _graph(directed, weighted, weight_type)
+    for v in range(n):
+        gr.add_vertex(str(v))
+    ends = list(range(min(k, n)))  # vertex repeated once per edge end
+    pairs = []
+    for v in range(len(ends), n):
+        targets = set()
+        while len(targets) < min(k, v):
+            targets.add(rnd.choice(ends))
+        for u in sorted(targets):
+            pairs.append((v, u))
+            ends.extend((v, u))
+    _edges(gr, pairs, rnd, weighted, low, high)
+    return gr
+
+
+def random_forest(n, trees=1, *, weighted=False, seed=0,
+                  low=1, high=100, weight_type=None):
+    """directed forest of random recursive trees, edges point from
+    parents to children"""
+    rnd = random.Random(seed)
+    gr = _graph(True, weighted, weight_type)
+    for v in range(n):
+        gr.add_vertex(str(v))
+    trees = max(1, min(trees, n))
+    # vertices 0 .. trees-1 are the roots
+    pairs = [(rnd.randrange(v), v) for v in range(trees, n)]
+    _edges(gr, pairs, rnd, weighted, low, high)
+    return gr
+
+
+def random_tree(n, *, weighted=False, seed=0, low=1, high=100,
+                weight_type=None):
+    return random_forest(n, 1, weighted=weighted, seed=seed, low=low,
+                         high=high, weight_type=weight_type)
+
+
+def negative_cycle(n, m, *, length=3, seed=0, low=1, high=100,
+                   weight_type=None):
+    """directed Erdos-Renyi graph with one planted negative cycle"""
+    gr = erdos_renyi(n, m, seed=seed, low=low, high=high,
+                     weight_type=weight_type)
+    rnd = random.Random(seed + 1)
+    cycle = [str(v) for v in rnd.sample(range(n), min(length, n))]
+    for x, y in zip(cycle, cycle[1:] + cycle[:1]):
+        if gr.exists_edge(x, y):
+            gr.remove_edge(x, y)
+        gr.add_edge(x, y, str(-high))
+    return gr
@@ -1,8 +1,34 @@
 
+from array import array
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+import heapq
+import itertools
 import math
-from graph import Graph, GraphException
+import operator
+import os
+import sys
+from graph import Graph, GraphException, NegativeCycleException
+from disjoint_set import DisjointSet
+from shared_csr import SharedCSR, attach
+
+try:
+    import numpy as np
+except ImportError:  # optional, only makes Floyd-Warshall faster
+    np = None
 
 # All tasks should accept graph as first argument!
+# Optional settings of a task are keyword-only (e.g. engine=...)
+
+
+def _weight(w):
+    """numeric value of edge mark"""
+    try:
+        return float(w)
+    except (TypeError, ValueError):
+        raise GraphException(("Graph has a "
+                              "non-numeric edge mark!"))
 
 
 def task1(gr, v):
@@ -10,12 +36,7 @@ def task1(gr, v):
     if not gr.is_directed():
         raise GraphException("This task requires a directed graph!")
 
-    out_deg = len(gr.get_adjacent(v))
-    ret = set()
-    for vert in gr.get_vertices():
-        if len(gr.get_adjacent(vert)) > out_deg:
-            ret.add(vert)
-    return ret
+    return gr.degree_index().greater(gr.get_outdeg(v))
 
 
 def task2(gr, v):
@@ -26,258 +47,904 @@ def task2(gr, v):
     return gr.get_vertices() - gr.get_adjacent(v).keys() - {v}
 
 
-def task3(gr):
+def task3(gr, *, in_place=False):
     """delete solo edges from directed graph"""
     if not gr.is_directed():
         raise GraphException("This task requires a directed graph!")
 
-    newgr = Graph(gr)
-    for v_from in newgr.get_vertices():
-        for v_to in gr.get_adjacent(v_from):
-            if not gr.exists_edge(v_to, v_from):
-                newgr.remove_edge(v_from, v_to)
-
+    verts = gr.get_vertices()
+    if in_place:
+        solo = [(v_from, v_to) for v_from in verts
+                for v_to in gr.get_adjacent(v_from)
+                if not gr.exists_edge(v_to, v_from)]
+        for v_from, v_to in solo:
+            gr.remove_edge(v_from, v_to)
+        return gr
+
+    # build the result from the mutual edges only, prices keep their type
+    newgr = Graph(gr.list_attributes(), weight_type=gr.get_weight_type())
+    for v in verts:
+        newgr.add_vertex(v)
+    newgr.add_edges_from((v_from, v_to, w) for v_from in verts
+                         for v_to, w in gr.get_adjacent(v_from).items()
+                         if gr.exists_edge(v_to, v_from))
     return newgr
 
 
-def task4(gr):
+def _find_cycle(gr, verts, seen):
+    """cycle among vertices not in seen by colour DFS: vertices on the
+    current path are grey, seen ones that left it are black"""
+    for start in verts:
+        if start in seen:
+            continue
+        seen.add(start)
+        path = [start]
+        on_path = {start: 0}
+        nexts = [iter(gr.get_adjacent(start))]
+        while len(path) > 0:
+            for x in nexts[-1]:
+                if x in on_path:
+                    return path[on_path[x]:]
+                if x not in seen:
+                    seen.add(x)
+                    on_path[x] = len(path)
+                    path.append(x)
+                    nexts.append(iter(gr.get_adjacent(x)))
+                    break
+            else:
+                del on_path[path.pop()]
+                nexts.pop()
+    return None
+
+
+def task4(gr, *, detail=False):
     """check whether orgraph is either a forest or a tree"""
     if not gr.is_directed():
         raise GraphException("This task requires a directed graph!")
 
-    degs = [gr.get_incdeg(vert) for vert in gr.get_vertices()]
-
-    if any(deg > 1 for deg in degs):
-        return "neither"
-
-    def dfs(v):
-        stack = [v]
-        used = {v}
-        active = set()
+    verts = gr.get_vertices()
+    roots = []
+    multi_parent = None
+    for v in verts:
+        deg = gr.get_incdeg(v)
+        if deg == 0:
+            roots.append(v)
+        elif deg > 1 and multi_parent is None:
+            multi_parent = v
+
+    cycle = None
+    if multi_parent is None:
+        # every vertex has at most one parent, so one walk down from the
+        # roots visits each vertex once; the rest lie on or below cycles
+        seen = set(roots)
+        stack = list(roots)
         while len(stack) > 0:
-            top = stack[-1]
-            active.add(top)
-            ex = False
-            for x in gr.get_adjacent(top):
-                if x not in used:
+            for x in gr.get_adjacent(stack.pop()):
+                if x not in seen:
+                    seen.add(x)
                     stack.append(x)
-                    used.add(x)
-                    ex = True
-                elif x in active:
-                    return True
-            if not ex:  # need to go back
-                stack.pop()
-                active.remove(top)
-        return False
-
-    if any(dfs(x) for x in gr.get_vertices()):  # cylces
-        return "neither"
-
-    if degs.count(0) != 1:
-        return "forest"
+        if len(seen) != len(verts):
+            cycle = _find_cycle(gr, verts, seen)
+
+    if multi_parent is not None or cycle is not None:
+        res = "neither"
+    elif len(roots) != 1:
+        res = "forest"
+    else:
+        res = "tree"
+
+    if detail:
+        return {"result": res, "roots": roots, "cycle": cycle,
+                "multi_parent": multi_parent}
+    return res
 
-    return "tree"
 
+def task5(gr, u, v, *, first=False):
+    """find vertices with shortest paths from u and v of the same size
 
-def task5(gr, u, v):  # TODO: solve this one
-    """find vertex such has paths from u and v with the same size"""
+    Both searches advance one level at a time, a vertex found by both in
+    the same level is at equal distance. With first=True only the
+    nearest such vertices are returned, the search stops there.
+    """
 
     if u == v:
         raise GraphException("Vertices were the same!")
+    verts = gr.get_vertices()
+    if u not in verts or v not in verts:
+        raise GraphException("No such vertex!")
+
+    seen_u = {u}
+    seen_v = {v}
+    front_u = deque([u])
+    front_v = deque([v])
+    res = set()
+    # a vertex can match only while both sides find new vertices
+    while len(front_u) > 0 and len(front_v) > 0:
+        for front, seen in ((front_u, seen_u), (front_v, seen_v)):
+            for _ in range(len(front)):  # just the current level
+                for x in gr.get_adjacent(front.popleft()):
+                    if x not in seen:
+                        seen.add(x)
+                        front.append(x)
+        level = set(front_u).intersection(front_v)
+        res |= level
+        if first and len(level) > 0:
+            break
 
-    q = [u, v]
-    used = {u, v}
-    lens_u = {u: 0}
-    lens_v = {v: 0}
-    active = set()
-    while len(q) > 0:
-        el = q.pop(0)
-        active.add(el)
-        for nei in gr.get_adjacent(el):
-            if nei not in used:
-                q.append(nei)
-                used.add(nei)
-            elif nei in active:
-                pass
-
-    return used
+    return res
 
 
-def task6(gr):
-    """Prim algorithm"""
+def _prim(gr, res):
+    seen = set()
+    for root in gr.get_vertices():
+        if root in seen:
+            continue
+        seen.add(root)
+        heap = [(_weight(w), v_to, root, w)
+                for v_to, w in gr.get_adjacent(root).items()]
+        heapq.heapify(heap)
+        while len(heap) > 0:
+            _, v_from, v_to, w = heapq.heappop(heap)
+            if v_from in seen:  # stale entry
+                continue
+            seen.add(v_from)
+            res.add_edge(v_from, v_to, w)
+            for nei, nw in gr.get_adjacent(v_from).items():
+                if nei not in seen:
+                    heapq.heappush(heap, (_weight(nw), nei, v_from, nw))
+
+
+def _kruskal(gr, res):
+    edges = []
+    done = set()
+    for v_from in gr.get_vertices():
+        for v_to, w in gr.get_adjacent(v_from).items():
+            if v_to not in done and v_to != v_from:
+                edges.append((_weight(w), v_from, v_to, w))
+        done.add(v_from)
+    edges.sort()
+
+    # the forest is complete once it joins what the graph itself joins
+    target = gr.connectivity().num_components()
+    comps = DisjointSet(gr.get_vertices())
+    for _, v_from, v_to, w in edges:
+        if comps.union(v_from, v_to):
+            res.add_edge(v_from, v_to, w)
+            if comps.count() == target:
+                break
+
+
+def task6(gr, *, engine="prim"):
+    """minimum spanning tree (forest if graph is disconnected)"""
 
     if gr.is_directed() or not gr.is_weighted():
         raise GraphException(("This task requires "
                               "a non-directed weighted graph!"))
 
-    verts = gr.get_vertices()
-    first, *_ = verts
-
-    seen = {first}
-    res = Graph()
-
-    while len(seen) != len(verts):
-        medg = None
-        for v_from in verts - seen:
-            for v_to, w in gr.get_adjacent(v_from).items():
-                if v_to in seen:
-                    edg = (w, v_from, v_to)
-                    if medg is None or edg < medg:
-                        medg = edg
-        if medg is None:
-            raise GraphException("Graph was not connected!")
-        w, v_from, v_to = medg
-        seen.add(v_from)
-        res.add_edge(v_from, v_to, w)
+    engines = {"prim": _prim, "kruskal": _kruskal}
+    if engine not in engines:
+        raise GraphException(f"Unknown engine {engine}, "
+                             f"use one of: {', '.join(engines)}")
+
+    res = Graph(("not_directed", "weighted"),
+                weight_type=gr.get_weight_type())
+    for v in gr.get_vertices():
+        res.add_vertex(v)
+    engines[engine](gr, res)
 
     return res
 
 
-def task7(gr, u):
+def task7(gr, u, *, mod=None):
     """counts of shortest paths from u to other vertices"""
 
     if not gr.is_weighted():
         raise GraphException("This task requires a weighted graph!")
 
-    verts = gr.get_vertices()
-    d = {v: math.inf for v in verts}
-    d[u] = 0
-    pred = {v: set() for v in verts}
+    if u not in gr.get_vertices():
+        raise GraphException("No such vertex!")
+    mod = _modulus(mod)
 
-    unused = set(verts)
-    cur = u
-    while len(unused) > 0:
-        for y, w in gr.get_adjacent(cur).items():
-            try:
-                w = float(w)
-            except ValueError:
-                raise GraphException(("Graph has a "
-                                      "non-numeric edge mark!"))
-            if w < 0:
-                raise GraphException("Graph has a negative edge!")
-            if d[y] > d[cur] + w:
-                pred[y] = {cur}
-                d[y] = d[cur] + w
-            elif d[y] == d[cur] + w:
-                pred[y].add(cur)
-        unused.remove(cur)
-        cur = min(unused, default=None, key=lambda x: d[x])
-
-    ways = {v: 0 for v in verts}
-    ways[u] = 1
+    return _path_counts(gr, u, mod)[1]
 
-    def calc(x):
-        for y in gr.get_adjacent(x):
-            if x in pred[y]:
-                ways[y] += ways[x]
-                pred[y].remove(x)
-                if len(pred[y]) == 0:
-                    calc(y)
 
-    calc(u)
+def _modulus(mod):
+    """mod as int, counts are taken modulo a positive integer"""
+    if mod is None:
+        return None
+    mod = int(mod)
+    if mod < 1:
+        raise GraphException("Modulus should be a positive integer!")
+    return mod
 
-    return ways
 
+def _path_counts(gr, u, mod):
+    """distances from u to reachable vertices and counts of shortest
+    paths to all vertices"""
+    verts = gr.get_vertices()
+    typed = gr.get_weight_type() is not None
+
+    # Dijkstra, remembering every predecessor on a shortest path
+    d = {u: 0}
+    pred = {u: []}
+    order = []
+    done = set()
+    heap = [(0, u)]
+    while len(heap) > 0:
+        dist, cur = heapq.heappop(heap)
+        if cur in done:  # stale entry
+            continue
+        done.add(cur)
+        order.append(cur)
+        for y, w in gr.get_adjacent(cur).items():
+            if not typed:
+                w = _weight(w)
+            if w < 0:
+                raise GraphException("Graph has a negative edge!")
+            nd = dist + w
+            dy = d.get(y, math.inf)
+            if nd < dy:
+                d[y] = nd
+                pred[y] = [cur]
+                heapq.heappush(heap, (nd, y))
+            elif nd == dy:
+                pred[y].append(cur)
+
+    # accumulate counts over the shortest path DAG in topological order
+    succ = {x: [] for x in order}
+    indeg = {}
+    for y in order:
+        indeg[y] = len(pred[y])
+        for x in pred[y]:
+            succ[x].append(y)
 
-def task8(gr, u, v, k):  # TODO: find k shortest in sorted order instead
-    """find k shortest paths from u to v"""
-
+    ways = {v: 0 for v in verts}
+    ways[u] = 1 if mod is None else 1 % mod
+    queue = [u] if indeg[u] == 0 else []
+    for x in queue:  # grows while iterating
+        for y in succ[x]:
+            ways[y] += ways[x]
+            if mod is not None:
+                ways[y] %= mod
+            indeg[y] -= 1
+            if indeg[y] == 0:
+                queue.append(y)
+
+    if len(queue) != len(order):
+        raise GraphException(("Graph has a zero-weight cycle, "
+                              "count of shortest paths is infinite!"))
+
+    return d, ways
+
+
+def _csr_rows(offsets, targets, weights):
+    """((target, weight), ...) for every vertex id, cheaper to iterate
+    than CSR slices when the graph is traversed many times"""
+    return [tuple(zip(targets[offsets[x]:offsets[x + 1]],
+                      weights[offsets[x]:offsets[x + 1]]))
+            for x in range(len(offsets) - 1)]
+
+
+def _path_counts_csr(rows, s, mod, positive, dist, ways, indeg):
+    """(id, count) of vertices reachable from id s, as in _path_counts
+
+    dist, ways and indeg are scratch lists of n entries holding
+    inf, 0 and 0; they are left that way for the next source. If all
+    weights are positive, predecessors are settled first and counts are
+    summed up during Dijkstra itself.
+    """
+    dist[s] = 0
+    ways[s] = 1 if mod is None else 1 % mod
+    touched = [s]
+    try:
+        order = []
+        heap = [(0, s)]
+        while len(heap) > 0:
+            d, x = heapq.heappop(heap)
+            if d > dist[x]:  # stale entry
+                continue
+            order.append(x)
+            for y, w in rows[x]:
+                if not positive and w < 0:
+                    raise GraphException("Graph has a negative edge!")
+                nd = d + w
+                dy = dist[y]
+                if nd < dy:
+                    if dy == math.inf:
+                        touched.append(y)
+                    dist[y] = nd
+                    heapq.heappush(heap, (nd, y))
+                    if positive:
+                        ways[y] = ways[x]
+                elif nd == dy and positive:
+                    ways[y] += ways[x]
+                    if mod is not None:
+                        ways[y] %= mod
+        if positive:
+            return [(x, ways[x]) for x in order]
+
+        # zero weights: accumulate counts over the shortest path DAG
+        # in topological order
+        for x in order:
+            for y, w in rows[x]:
+                if dist[x] + w == dist[y]:
+                    indeg[y] += 1
+        queue = [s] if indeg[s] == 0 else []
+        for x in queue:  # grows while iterating
+            for y, w in rows[x]:
+                if dist[x] + w == dist[y]:
+                    ways[y] += ways[x]
+                    if mod is not None:
+                        ways[y] %= mod
+                    indeg[y] -= 1
+                    if indeg[y] == 0:
+                        queue.append(y)
+
+        if len(queue) != len(order):
+            raise GraphException(("Graph has a zero-weight cycle, "
+                                  "count of shortest paths is infinite!"))
+        return [(x, ways[x]) for x in order]
+    finally:
+        for x in touched:
+            dist[x] = math.inf
+            ways[x] = 0
+            indeg[x] = 0
+
+
+def _path_counts_chunk(sources, mod, positive):
+    if "rows" not in _worker:  # kept for the worker's lifetime
+        _worker["rows"] = _csr_rows(_worker["offsets"], _worker["targets"],
+                                    _worker["weights"])
+        n = len(_worker["rows"])
+        _worker["dist"] = [math.inf] * n
+        _worker["ways"] = [0] * n
+        _worker["indeg"] = [0] * n
+    return [_path_counts_csr(_worker["rows"], s, mod, positive,
+                             _worker["dist"], _worker["ways"],
+                             _worker["indeg"])
+            for s in sources]
+
+
+def task7_many(gr, sources, *, workers=1, mod=None):
+    """yield (source, task7 result) for every source, in order
+
+    The graph is frozen and its weights converted once, and scratch
+    buffers are reused from source to source. Runs serially unless asked
+    for workers > 1 (e.g. os.cpu_count()): then the sources are spread
+    over a process pool sharing the CSR arrays (if weights are int or
+    float); only a few chunks are in flight at a time, so memory stays
+    bounded however many sources come.
+    """
     if not gr.is_weighted():
         raise GraphException("This task requires a weighted graph!")
-
+    mod = _modulus(mod)
+
+    frozen = gr.freeze()
+    names = frozen.names()
+    n = len(names)
+    offsets, targets = frozen.offsets(), frozen.targets()
+    weights = frozen.weights()
+    if not isinstance(weights, memoryview) and \
+            frozen.get_weight_type() is None:
+        weights = array("d", map(_weight, weights))
+    positive = all(w > 0 for w in weights)
+
+    def result(reached):
+        ways = dict.fromkeys(names, 0)
+        for x, count in reached:
+            ways[names[x]] = count
+        return ways
+
+    # sources are read lazily, in chunks
+    pairs = ((u, frozen.index_of(u)) for u in sources)
+    chunks = iter(lambda: list(itertools.islice(pairs, 16)), [])
+
+    if workers <= 1 or n < 64 or isinstance(weights, tuple):
+        rows = _csr_rows(offsets, targets, weights)
+        dist = [math.inf] * n
+        ways = [0] * n
+        indeg = [0] * n
+        for chunk in chunks:
+            for u, s in chunk:
+                yield u, result(_path_counts_csr(rows, s, mod, positive,
+                                                 dist, ways, indeg))
+        return
+
+    with SharedCSR(offsets=offsets, targets=targets,
+                   weights=weights) as shared, \
+         ProcessPoolExecutor(workers, initializer=_init_csr_worker,
+                             initargs=(shared.handle(),)) as pool:
+        def finished(chunk, future):
+            for (u, _), reached in zip(chunk, future.result()):
+                yield u, result(reached)
+
+        pending = deque()  # (chunk, future), oldest first
+        for chunk in chunks:
+            pending.append((chunk, pool.submit(
+                _path_counts_chunk, [s for _, s in chunk], mod,
+                positive)))
+            if len(pending) >= 2 * workers:
+                yield from finished(*pending.popleft())
+        while len(pending) > 0:
+            yield from finished(*pending.popleft())
+
+
+def _pred_cycle(pred, v):
+    """cycle of the predecessor tree met going up from v, None if the
+    walk reaches the source"""
+    walk = {}  # vertex -> position
+    while v is not None and v not in walk:
+        walk[v] = len(walk)
+        v = pred[v]
+    if v is None:
+        return None
+    return list(walk)[walk[v]:][::-1]
+
+
+def _pred_graph_cycle(pred):
+    """any cycle of the predecessor links, None if they form a tree"""
+    done = set()
+    for v in pred:
+        walk = {}  # vertex -> position
+        while v is not None and v not in walk and v not in done:
+            walk[v] = len(walk)
+            v = pred[v]
+        if v in walk:
+            return list(walk)[walk[v]:][::-1]
+        done.update(walk)
+    return None
+
+
+def _bellman_ford(gr, u):
+    """distances from u to vertices reachable from it"""
     verts = gr.get_vertices()
-    d = {v: math.inf for v in verts}
-    d[u] = 0
-    pred = {v: set() for v in verts}
-    k = int(k)
+    typed = gr.get_weight_type() is not None
+    d = {u: 0}
+    pred = {u: None}
 
     for _ in range(len(verts) - 1):
-        for x in verts:
+        changed = False
+        for x in list(d):
             for y, w in gr.get_adjacent(x).items():
-                try:
-                    w = float(w)
-                except ValueError:
-                    raise GraphException(("Graph has a "
-                                          "non-numeric edge mark!"))
-                if d[y] > d[x] + w:
-                    pred[y] = {x}
+                if not typed:
+                    w = _weight(w)
+                if d.get(y, math.inf) > d[x] + w:
                     d[y] = d[x] + w
-                elif d[y] == d[x] + w:
-                    pred[y].add(x)
-
-    for x in verts:
+                    pred[y] = x
+                    changed = True
+        if not changed:
+            return d
+        # a cycle of predecessors is a negative one, catch it early
+        cycle = _pred_graph_cycle(pred)
+        if cycle is not None:
+            raise NegativeCycleException("Graph has a negative cycle!",
+                                         cycle)
+
+    for x in d:
         for y, w in gr.get_adjacent(x).items():
-            if d[y] > d[x] + int(w):
-                raise GraphException("Graph has a negative cycle!")
-
-    ways = []
-
-    def calc(cur, path):
-        mod_path = cur + (" " + path if path != "" else "")
-        if len(pred[cur]) == 0:
-            ways.append(mod_path)
+            if d[y] > d[x] + (w if typed else _weight(w)):
+                pred[y] = x
+                raise NegativeCycleException("Graph has a negative cycle!",
+                                             _pred_cycle(pred, y))
+
+    return d
+
+
+def _spfa(gr, u):
+    """distances from u to vertices reachable from it, Bellman-Ford
+    relaxing only edges of vertices whose distance changed"""
+    n = len(gr.get_vertices())
+    typed = gr.get_weight_type() is not None
+    d = {u: 0}
+    pred = {u: None}
+    queue = deque([u])
+    queued = {u}
+    relaxed = 0
+    while len(queue) > 0:
+        x = queue.popleft()
+        queued.discard(x)
+        dx = d[x]
+        for y, w in gr.get_adjacent(x).items():
+            nd = dx + (w if typed else _weight(w))
+            if nd < d.get(y, math.inf):
+                d[y] = nd
+                pred[y] = x
+                if y not in queued:
+                    queued.add(y)
+                    queue.append(y)
+                # any cycle of predecessors is a negative one; looking
+                # for it every n relaxations costs O(1) per relaxation
+                relaxed += 1
+                if relaxed % n == 0:
+                    cycle = _pred_graph_cycle(pred)
+                    if cycle is not None:
+                        raise NegativeCycleException(
+                            "Graph has a negative cycle!", cycle)
+
+    return d
+
+
+def _dijkstra_path(gr, u, v, cost, banned_verts, banned_edges):
+    """cheapest (cost, path) from u to v avoiding banned parts, or None"""
+    d = {u: 0}
+    pred = {u: None}
+    done = set()
+    heap = [(0, u)]
+    while len(heap) > 0:
+        dist, cur = heapq.heappop(heap)
+        if cur in done:
+            continue
+        if cur == v:
+            path = []
+            while cur is not None:
+                path.append(cur)
+                cur = pred[cur]
+            return dist, tuple(reversed(path))
+        done.add(cur)
+        for y, w in gr.get_adjacent(cur).items():
+            if y in banned_verts or (cur, y) in banned_edges:
+                continue
+            nd = dist + cost(cur, y, w)
+            if nd < d.get(y, math.inf):
+                d[y] = nd
+                pred[y] = cur
+                heapq.heappush(heap, (nd, y))
+    return None
+
+
+def k_shortest_paths(gr, u, v, *, engine="spfa"):
+    """lazily yield (path, cost) of simple paths from u to v, cheapest first
+
+    Yen's algorithm: each next path costs a few Dijkstra runs, so taking
+    the first k paths does bounded work. Negative edges are handled by
+    reweighting with potentials from engine "spfa" or "bellman_ford"
+    (as in Johnson's algorithm).
+    """
+    if not gr.is_weighted():
+        raise GraphException("This task requires a weighted graph!")
+    engines = {"spfa": _spfa, "bellman_ford": _bellman_ford}
+    if engine not in engines:
+        raise GraphException(f"Unknown engine {engine}, "
+                             f"use one of: {', '.join(engines)}")
+    verts = gr.get_vertices()
+    if u not in verts or v not in verts:
+        raise GraphException("No such vertex!")
+    if not gr.connectivity().connected(u, v):
+        return
+
+    typed = gr.get_weight_type() is not None
+    if any(_weight(w) < 0 for x in verts
+           for w in gr.get_adjacent(x).values()):
+        h = engines[engine](gr, u)
+
+        def cost(x, y, w):
+            return max(0, (w if typed else _weight(w)) + h[x] - h[y])
+    elif typed:
+        def cost(x, y, w):
+            return w
+    else:
+        def cost(x, y, w):
+            return _weight(w)
+
+    def path_cost(path):
+        prices = (gr.get_edge_attr(x, y) for x, y in zip(path, path[1:]))
+        return sum(prices if typed else map(_weight, prices))
+
+    first = _dijkstra_path(gr, u, v, cost, set(), set())
+    if first is None:
+        return
+    found = [first[1]]
+    yield first[1], path_cost(first[1])
+
+    candidates = []
+    seen = {first[1]}
+    while True:
+        last = found[-1]
+        root_cost = 0
+        for i, spur in enumerate(last[:-1]):
+            root = last[:i + 1]
+            banned_edges = {(p[i], p[i + 1]) for p in found
+                            if p[:i + 1] == root}
+            res = _dijkstra_path(gr, spur, v, cost,
+                                 set(root[:-1]), banned_edges)
+            if res is not None:
+                path = root[:-1] + res[1]
+                if path not in seen:
+                    seen.add(path)
+                    heapq.heappush(candidates, (root_cost + res[0], path))
+            root_cost += cost(spur, last[i + 1],
+                              gr.get_edge_attr(spur, last[i + 1]))
+
+        if len(candidates) == 0:
             return
+        _, path = heapq.heappop(candidates)
+        found.append(path)
+        yield path, path_cost(path)
 
-        for prev in pred[cur]:
-            calc(prev, mod_path)
-
-    calc(v, "")
 
-    return ways[:k]
+def task8(gr, u, v, k, *, engine="spfa"):
+    """find k shortest paths from u to v"""
+    k = int(k)
+    if k < 0:
+        raise GraphException("Count of paths can't be negative!")
+
+    return list(itertools.islice(k_shortest_paths(gr, u, v, engine=engine),
+                                 k))
+
+
+class ShortestPaths(Mapping):
+    """All-pairs shortest paths, {v: {u: "v ... u"}} computed on demand.
+
+    Holds a distance matrix and a predecessor matrix over vertex indices,
+    path strings are only rebuilt when a pair is looked up. Like before,
+    v is listed in its own row only if it lies on a cycle.
+    """
+
+    def __init__(self, names, dist, pred):
+        self.__names = names
+        self.__index = {v: i for i, v in enumerate(names)}
+        self.__dist = dist
+        self.__pred = pred
+        self.__negative = [k for k in range(len(names)) if dist[k][k] < 0]
+
+    def __getitem__(self, v):
+        if v not in self.__index:
+            raise KeyError(v)
+        return _PathsFrom(self, self.__index[v])
+
+    def __iter__(self):
+        return iter(self.__names)
+
+    def __len__(self):
+        return len(self.__names)
+
+    def __repr__(self):
+        return repr({v: dict(row) for v, row in self.items()})
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + sum(
+            sys.getsizeof(row) for row in itertools.chain(self.__dist,
+                                                          self.__pred))
+
+    def distance(self, v, u):
+        return self.__dist[self.__index[v]][self.__index[u]]
+
+    def path(self, v, u):
+        """tuple of vertices from v to u, None if there is no such path"""
+        i, j = self.__index[v], self.__index[u]
+        return self._path(i, j)
+
+    def _path(self, i, j):
+        dist, pred, names = self.__dist, self.__pred, self.__names
+        if dist[i][j] == math.inf:
+            return None
+        # path can be made arbitrarily cheap via a negative cycle vertex
+        if any(dist[i][k] != math.inf and dist[k][j] != math.inf
+               for k in self.__negative):
+            raise GraphException("Graph has a negative cycle!")
+        if i == j:
+            return (names[i],)
+        nodes = [j]
+        c = j
+        while c != i:
+            c = pred[i][c]
+            nodes.append(c)
+        return tuple(names[x] for x in reversed(nodes))
+
+    def _reachable(self, i):
+        row = self.__dist[i]
+        return [self.__names[j] for j in range(len(row))
+                if row[j] != math.inf]
+
+    def _way(self, i, u):
+        j = self.__index.get(u)
+        if j is None or self.__dist[i][j] == math.inf:
+            raise KeyError(u)
+        try:
+            return " ".join(self._path(i, j))
+        except GraphException:
+            return "<negative cycle>"
+
+
+class _PathsFrom(Mapping):
+    def __init__(self, paths, i):
+        self.__paths = paths
+        self.__i = i
+
+    def __getitem__(self, u):
+        return self.__paths._way(self.__i, u)
+
+    def __iter__(self):
+        return iter(self.__paths._reachable(self.__i))
+
+    def __len__(self):
+        return len(self.__paths._reachable(self.__i))
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+def _floyd_warshall(gr):
+    names = tuple(gr.get_vertices())
+    index = {v: i for i, v in enumerate(names)}
+    n = len(names)
+
+    dist = []
+    pred = []
+    for i, v in enumerate(names):
+        row = array("d", [math.inf]) * n
+        prow = array("l", [-1]) * n
+        for u, w in gr.get_adjacent(v).items():
+            row[index[u]] = _weight(w)
+            prow[index[u]] = i
+        dist.append(row)
+        pred.append(prow)
+
+    if np is not None:
+        dist, pred = _floyd_warshall_numpy(dist, pred)
+        return ShortestPaths(names, dist, pred)
+
+    # every pivot is applied to a whole row at once: map/compress run in C
+    # and only the improved cells are touched from Python
+    cols = range(n)
+    for k in range(n):
+        row_k = dist[k]
+        pred_k = pred[k]
+        for i in range(n):
+            row_i = dist[i]
+            dik = row_i[k]
+            if dik == math.inf:
+                continue
+            pred_i = pred[i]
+            better = map(operator.lt, map(dik.__add__, row_k), row_i)
+            for j in itertools.compress(cols, better):
+                row_i[j] = dik + row_k[j]
+                pred_i[j] = pred_k[j]
+
+    return ShortestPaths(names, dist, pred)
+
+
+def _floyd_warshall_numpy(dist, pred):
+    """the pivots of _floyd_warshall on whole matrices, rows are given
+    and returned as arrays"""
+    n = len(dist)
+    dist_m = np.array(dist, dtype=np.float64).reshape(n, n)
+    pred_m = np.array(pred, dtype=np.int64).reshape(n, n)
+    for k in range(n):
+        cand = dist_m[:, k, None] + dist_m[None, k, :]
+        better = cand < dist_m
+        np.minimum(dist_m, cand, out=dist_m)
+        pred_m = np.where(better, pred_m[k][None, :], pred_m)
+    return ([array("d", row) for row in dist_m.tolist()],
+            [array("l", row) for row in pred_m.tolist()])
+
+
+def _dijkstra_csr(offsets, targets, weights, s):
+    """distance and predecessor arrays from s over CSR arrays
+
+    As in Floyd-Warshall matrices, the entry of s itself is the cheapest
+    cycle through s (inf if there is none). Weights must be non-negative.
+    """
+    n = len(offsets) - 1
+    dist = array("d", [math.inf]) * n
+    pred = array("l", [-1]) * n
+    dist[s] = 0
+    cycle, cycle_pred = math.inf, -1
+    heap = [(0.0, s)]
+    while len(heap) > 0:
+        d, x = heapq.heappop(heap)
+        if d > dist[x]:  # stale entry
+            continue
+        lo, hi = offsets[x], offsets[x + 1]
+        for y, w in zip(targets[lo:hi], weights[lo:hi]):
+            nd = d + w
+            if y == s:
+                if nd < cycle:
+                    cycle, cycle_pred = nd, x
+            elif nd < dist[y]:
+                dist[y] = nd
+                pred[y] = x
+                heapq.heappush(heap, (nd, y))
+    dist[s] = cycle
+    pred[s] = cycle_pred
+    return dist, pred
+
+
+def _potentials(offsets, targets, weights):
+    """Bellman-Ford from a virtual source linked to every vertex,
+    None if the graph has a negative cycle"""
+    n = len(offsets) - 1
+    h = [0.0] * n
+    for _ in range(n + 1):
+        changed = False
+        for x in range(n):
+            hx = h[x]
+            for e in range(offsets[x], offsets[x + 1]):
+                y = targets[e]
+                if hx + weights[e] < h[y]:
+                    h[y] = hx + weights[e]
+                    changed = True
+        if not changed:
+            return h
+    return None
+
+
+_worker = {}
+
+
+def _init_csr_worker(handle):
+    _worker["blocks"], views = attach(handle)
+    _worker.update(views)
+
+
+def _johnson_chunk(sources):
+    res = []
+    for s in sources:
+        dist, pred = _dijkstra_csr(_worker["offsets"], _worker["targets"],
+                                   _worker["weights"], s)
+        res.append((s, dist.tobytes(), pred.tobytes()))
+    return res
 
 
-def task9(gr):
+def _johnson(gr, workers=None):
+    frozen = gr.freeze()
+    names = frozen.names()
+    n = len(names)
+    offsets, targets = frozen.offsets(), frozen.targets()
+    weights = frozen.weights()
+    if not isinstance(weights, memoryview):  # not packed as numbers
+        weights = [_weight(w) for w in weights]
+
+    h = _potentials(offsets, targets, weights)
+    if h is None:  # only Floyd-Warshall can mark negative cycle paths
+        return _floyd_warshall(gr)
+
+    # reweighting makes every edge non-negative, so Dijkstra applies
+    reweighted = array("d", bytes(8 * len(weights)))
+    for x in range(n):
+        for e in range(offsets[x], offsets[x + 1]):
+            reweighted[e] = max(0.0, weights[e] + h[x] - h[targets[e]])
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    dist = [None] * n
+    pred = [None] * n
+    if workers <= 1 or n < 64:
+        for s in range(n):
+            dist[s], pred[s] = _dijkstra_csr(offsets, targets,
+                                             reweighted, s)
+    else:
+        step = max(1, n // (4 * workers))
+        chunks = [range(lo, min(n, lo + step)) for lo in range(0, n, step)]
+        with SharedCSR(offsets=offsets, targets=targets,
+                       weights=reweighted) as shared, \
+             ProcessPoolExecutor(workers, initializer=_init_csr_worker,
+                                 initargs=(shared.handle(),)) as pool:
+            for res in pool.map(_johnson_chunk, chunks):
+                for s, dist_bytes, pred_bytes in res:
+                    dist[s] = array("d")
+                    dist[s].frombytes(dist_bytes)
+                    pred[s] = array("l")
+                    pred[s].frombytes(pred_bytes)
+
+    # back to real weights: d(s, t) = d'(s, t) - h(s) + h(t)
+    for s in range(n):
+        row = dist[s]
+        for t in range(n):
+            if row[t] != math.inf:
+                row[t] += h[t] - h[s]
+
+    return ShortestPaths(names, dist, pred)
+
+
+def task9(gr, *, engine="floyd", workers=None):
     """find shortest path from each pair of vertices"""
     if not gr.is_weighted():
         raise GraphException("This task requires a weighted graph!")
 
-    verts = gr.get_vertices()
-
-    d = {v: {} for v in verts}
-    nxt = {v: {} for v in verts}
-    for v in verts:
-        d[v][v] = 0
-        nxt[v][v] = v
-        adj = gr.get_adjacent(v)
-        for u in adj:
-            try:
-                d[v][u] = float(adj[u])
-            except ValueError:
-                raise GraphException(("Graph has a "
-                                      "non-numeric edge mark!"))
-            nxt[v][u] = u
-        for u in verts - adj.keys():
-            d[v][u] = math.inf
-            nxt[v][u] = None
-
-    for x in verts:
-        for y in verts:
-            for z in verts:
-                if d[y][x] + d[x][z] < d[y][z]:
-                    d[y][z] = d[y][x] + d[x][z]
-                    nxt[y][z] = nxt[y][x]
-
-    ways = {v: {} for v in verts}
-    for v in verts:
-        for u in verts:
-            if nxt[v][u] is None:
-                continue
-            nodes = []
-            c = v
-            fail = False
-            if d[c][c] < 0:
-                fail = True
-            else:
-                while c != u:
-                    nodes.append(c)
-                    c = nxt[c][u]
-                    if d[c][c] < 0:
-                        fail = True
-                        break
-            if not fail:
-                nodes.append(u)
-                ways[v][u] = " ".join(nodes)
-            else:
-                ways[v][u] = "<negative cycle>"
-
-    return ways
+    if engine == "floyd":
+        return _floyd_warshall(gr)
+    if engine == "johnson":
+        return _johnson(gr, workers)
+    raise GraphException(f"Unknown engine {engine}, "
+                         "use one of: floyd, johnson")
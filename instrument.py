@@ -0,0 +1,103 @@
+from collections import Counter
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+
+
+class CountingGraph():
+    """Graph (or frozen graph) wrapper counting method calls and the
+    adjacency entries handed out (edges a task gets to visit).
+
+    Only calls on the wrapper are seen: a task that freezes the graph
+    works on the snapshot uncounted.
+    """
+
+    def __init__(self, gr):
+        self.__gr = gr
+        self.calls = Counter()
+        self.edge_visits = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self.__gr, name)
+        if not callable(attr):
+            return attr
+
+        def counted(*args, **kwargs):
+            self.calls[name] += 1
+            res = attr(*args, **kwargs)
+            if name in ("get_adjacent", "copy_adjacent"):
+                self.edge_visits += len(res)
+            return res
+        return counted
+
+
+class Instrumentation():
+    """Context manager measuring what runs inside it: wall time, peak
+    memory (tracemalloc), calls made on ins.graph and optionally a
+    cProfile profile (kept as ins.profile, dumped to profile_path).
+
+        with Instrumentation(gr, profile=True) as ins:
+            task7(ins.graph, "a")
+        print(ins.report())
+
+    Nothing here is touched by code run without it, so it costs nothing
+    unless used.
+    """
+
+    def __init__(self, gr=None, *, memory=True, profile=False,
+                 profile_path=None):
+        self.graph = None if gr is None else CountingGraph(gr)
+        self.seconds = None
+        self.peak_bytes = None
+        self.profile = None
+        self.__memory = memory
+        self.__profiler = None
+        if profile or profile_path is not None:
+            self.__profiler = cProfile.Profile()
+        self.__profile_path = profile_path
+        self.__own_tracing = False
+        self.__start = None
+
+    def __enter__(self):
+        if self.__memory:
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+                self.__own_tracing = True
+        if self.__profiler is not None:
+            self.__profiler.enable()
+        self.__start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.__start
+        if self.__profiler is not None:
+            self.__profiler.disable()
+            self.profile = pstats.Stats(self.__profiler)
+            if self.__profile_path is not None:
+                self.profile.dump_stats(self.__profile_path)
+        if self.__memory:
+            self.peak_bytes = tracemalloc.get_traced_memory()[1]
+            if self.__own_tracing:
+                tracemalloc.stop()
+                self.__own_tracing = False
+
+    def report(self, top=15):
+        """readable summary, with top most expensive functions if the
+        run was profiled"""
+        lines = [f"Time: {self.seconds * 1000:.1f} ms"]
+        if self.peak_bytes is not None:
+            lines.append(f"Peak memory: {self.peak_bytes / 2 ** 20:.2f} MiB")
+        if self.graph is not None:
+            lines.append(f"Edge visits: {self.graph.edge_visits}")
+            for name, count in self.graph.calls.most_common():
+                lines.append(f"  {name}: {count}")
+        if self.profile is not None and top > 0:
+            out = io.StringIO()
+            self.profile.stream = out
+            self.profile.sort_stats("cumulative").print_stats(top)
+            lines.append(out.getvalue().rstrip())
+        return "\n".join(lines)
@@ -0,0 +1,50 @@
+from multiprocessing import shared_memory
+import struct
+
+
+class SharedCSR():
+    """CSR arrays copied once into shared memory for worker processes.
+
+    Workers get a small picklable handle and attach to the same buffers,
+    so the graph isn't pickled for every task. Use as a context manager
+    so the segments are unlinked afterwards.
+    """
+
+    def __init__(self, **arrays):
+        self.__blocks = []
+        self.__handle = {}
+        for name, arr in arrays.items():
+            view = memoryview(arr)
+            size = view.nbytes
+            block = shared_memory.SharedMemory(create=True,
+                                               size=max(size, 1))
+            block.buf[:size] = view.cast("B")
+            self.__blocks.append(block)
+            self.__handle[name] = (block.name, view.format, len(view))
+
+    def handle(self):
+        return dict(self.__handle)
+
+    def close(self):
+        for block in self.__blocks:
+            block.close()
+            block.unlink()
+        self.__blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach(handle):
+    """open shared arrays of a handle: (blocks to keep alive, {name: view})"""
+    blocks = []
+    views = {}
+    for name, (block_name, fmt, length) in handle.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        size = length * struct.calcsize(fmt)
+        views[name] = block.buf[:size].cast(fmt)
+    return blocks, views
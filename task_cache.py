@@ -0,0 +1,96 @@
+from collections import OrderedDict
+import copy
+import functools
+import sys
+
+from graph import Graph, FrozenGraph
+
+
+def estimate_size(obj, seen=None):
+    """rough count of bytes held by a task result"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, (Graph, FrozenGraph)):
+        return sys.getsizeof(obj) + sum(
+            sys.getsizeof(v) + estimate_size(dict(obj.get_adjacent(v)))
+            for v in obj.get_vertices())
+    size = sys.getsizeof(obj)  # other objects should define __sizeof__
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k, seen) + estimate_size(v, seen)
+                    for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(x, seen) for x in obj)
+    return size
+
+
+class TaskCache():
+    """LRU memo of task results keyed on (task, graph version, arguments).
+
+    Graph versions change on every mutation and are unique among graphs,
+    so a stale or foreign result is never returned. Entries are evicted
+    least recently used first when either limit is exceeded.
+    """
+
+    def __init__(self, max_entries=128, max_bytes=256 << 20):
+        self.__entries = OrderedDict()  # key -> (result, size)
+        self.__max_entries = max_entries
+        self.__max_bytes = max_bytes
+        self.__bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def size(self):
+        """estimated bytes held by cached results"""
+        return self.__bytes
+
+    def clear(self):
+        self.__entries.clear()
+        self.__bytes = 0
+
+    def call(self, task, gr, *args, **kwargs):
+        key = (task, gr.get_version(), args, tuple(sorted(kwargs.items())))
+        try:
+            res, _ = self.__entries[key]
+        except KeyError:
+            pass
+        except TypeError:  # unhashable arguments
+            return task(gr, *args, **kwargs)
+        else:
+            self.hits += 1
+            self.__entries.move_to_end(key)
+            return _detached(res)
+
+        self.misses += 1
+        res = task(gr, *args, **kwargs)
+        size = estimate_size(res)
+        if size <= self.__max_bytes:
+            self.__entries[key] = (res, size)
+            self.__bytes += size
+            while len(self.__entries) > self.__max_entries or \
+                    self.__bytes > self.__max_bytes:
+                _, (_, old_size) = self.__entries.popitem(last=False)
+                self.__bytes -= old_size
+        return _detached(res)
+
+    def wrap(self, task):
+        """task with the same signature, answered from this cache"""
+        @functools.wraps(task)
+        def cached(gr, *args, **kwargs):
+            return self.call(task, gr, *args, **kwargs)
+        return cached
+
+
+def _detached(res):
+    """result the caller may change without spoiling the cached one"""
+    if isinstance(res, Graph):
+        return Graph(res)  # copy-on-write, cheap
+    if isinstance(res, (dict, list, set)):
+        return copy.copy(res)
+    return res